@@ -0,0 +1,246 @@
+"""
+Optional worker processes for the Gemini work of !bot and !verify.
+
+With AI_WORKERS=0 (the default) jobs run on the bot's own event loop. With
+AI_WORKERS=N the bot starts N `python -m ai_workers` child processes and sends each
+job to the least busy one over its stdin. Results come back on its stdout and
+resolve the caller's future, so the command just awaits them.
+
+Every message is a length-prefixed pickle:
+  bot -> worker: (job id, "module:function", args, settings snapshot)
+  worker -> bot: (job id, ok, result or error message)
+
+A worker runs its jobs concurrently on its own event loop. Gemini requests, base64
+encoding and JSON parsing then no longer share the loop that keeps the gateway
+heartbeat going. Workers exit when the bot closes their stdin (or dies).
+"""
+import asyncio
+import importlib
+import itertools
+import os
+import pickle
+import struct
+import subprocess
+import sys
+import threading
+
+import config
+from bot_logging import log, report_exception, setup_logging
+
+HEADER = struct.Struct('!I')
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class WorkerError(Exception):
+    """A job failed inside a worker process (the message is the original error's)"""
+
+
+def _pack(message):
+    data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    return HEADER.pack(len(data)) + data
+
+
+def _read_message(stream):
+    """Next message from a binary stream, None at EOF"""
+    header = stream.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+    (size,) = HEADER.unpack(header)
+    data = stream.read(size)
+    if len(data) < size:
+        return None
+    return pickle.loads(data)
+
+
+class _Worker:
+    """One child process, with a thread that reads its results"""
+
+    def __init__(self, index, loop):
+        self.index = index
+        self.loop = loop
+        self.pending = {}
+        self.closing = False
+        self._write_lock = threading.Lock()
+        self.process = subprocess.Popen([sys.executable, '-m', 'ai_workers'], cwd=HERE,
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        threading.Thread(target=self._read, name=f"ai-worker-{index}-results", daemon=True).start()
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def send(self, data):
+        """Blocking write of one job (called via asyncio.to_thread)"""
+        with self._write_lock:
+            self.process.stdin.write(data)
+            self.process.stdin.flush()
+
+    def _read(self):
+        while True:
+            try:
+                message = _read_message(self.process.stdout)
+            except Exception:
+                report_exception('ai_workers.read', worker=self.index)
+                message = None
+            if message is None:
+                break
+            try:
+                self.loop.call_soon_threadsafe(self._resolve, *message)
+            except RuntimeError:
+                return  # The bot's event loop is already closed
+        try:
+            self.loop.call_soon_threadsafe(self._exited)
+        except RuntimeError:
+            pass
+
+    def _resolve(self, job_id, ok, result):
+        future = self.pending.pop(job_id, None)
+        if future is None or future.done():
+            return  # The caller gave up waiting
+        if ok:
+            future.set_result(result)
+        else:
+            future.set_exception(WorkerError(result))
+
+    def _exited(self):
+        if self.closing and not self.pending:
+            return
+        log.warning("AI worker %d exited, failing %d job(s)", self.index, len(self.pending))
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(WorkerError(f"AI worker {self.index} exited"))
+        self.pending.clear()
+
+
+class WorkerPool:
+    """N worker processes, jobs go to the one with the fewest jobs in flight"""
+
+    def __init__(self, size):
+        self.size = size
+        self.loop = asyncio.get_running_loop()
+        self.workers = [_Worker(index, self.loop) for index in range(size)]
+        self._job_ids = itertools.count()
+
+    async def run(self, func, *args):
+        for index, worker in enumerate(self.workers):
+            if not worker.alive():
+                self.workers[index] = _Worker(index, self.loop)
+        worker = min(self.workers, key=lambda w: len(w.pending))
+
+        job_id = next(self._job_ids)
+        future = self.loop.create_future()
+        worker.pending[job_id] = future
+        data = _pack((job_id, f"{func.__module__}:{func.__qualname__}", args, config.settings))
+        try:
+            await asyncio.to_thread(worker.send, data)
+        except OSError as e:
+            worker.pending.pop(job_id, None)
+            raise WorkerError(f"AI worker {worker.index} is not accepting jobs: {e}") from e
+        return await future
+
+    def close(self, timeout=5):
+        """Close the workers' stdin (they finish what they have and exit), kill stragglers"""
+        for worker in self.workers:
+            worker.closing = True
+            try:
+                worker.process.stdin.close()
+            except OSError:
+                pass
+        for worker in self.workers:
+            try:
+                worker.process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                worker.process.kill()
+
+
+_pool = None
+
+
+def start(workers):
+    """Start the pool on the running event loop (no-op for 0 workers)"""
+    global _pool
+    if workers > 0 and _pool is None:
+        _pool = WorkerPool(workers)
+        log.info("Started %d AI worker process(es)", workers)
+    return _pool
+
+
+def stop():
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
+
+
+async def restart():
+    """
+    Replace the running pool with fresh workers, which import the current code (`!reload`).
+    New jobs go to the new workers at once, the old ones finish theirs and exit.
+    """
+    global _pool
+    if _pool is None:
+        return False
+    old, _pool = _pool, WorkerPool(_pool.size)
+    # close() waits for the old processes, keep that off the event loop
+    await asyncio.to_thread(old.close)
+    log.info("Restarted %d AI worker process(es)", _pool.size)
+    return True
+
+
+async def run(func, *args):
+    """`await func(*args)` in a worker process if the pool is running, on this event loop otherwise"""
+    if _pool is None:
+        return await func(*args)
+    return await _pool.run(func, *args)
+
+
+# Worker process side
+
+async def _handle(out, job_id, name, args, settings):
+    # Jobs read config.settings like the bot does, this is the bot's snapshot
+    config.settings = settings
+    try:
+        module, func = name.split(':')
+        message = (job_id, True, await getattr(importlib.import_module(module), func)(*args))
+    except Exception as e:
+        # Only the message crosses the pipe, not every exception type unpickles in the bot
+        message = (job_id, False, str(e) or type(e).__name__)
+    try:
+        data = _pack(message)
+    except Exception as e:
+        data = _pack((job_id, False, f"Result could not be sent back: {e}"))
+    out.write(data)
+    out.flush()
+
+
+async def _serve():
+    out = sys.stdout.buffer
+    # Anything printed must not end up in the result stream
+    sys.stdout = sys.stderr
+    listener = setup_logging()
+
+    loop = asyncio.get_running_loop()
+    jobs = set()
+    finished = asyncio.Event()
+
+    def start_job(message):
+        task = loop.create_task(_handle(out, *message))
+        jobs.add(task)
+        task.add_done_callback(jobs.discard)
+
+    def read_jobs():
+        while True:
+            message = _read_message(sys.stdin.buffer)
+            if message is None:
+                break
+            loop.call_soon_threadsafe(start_job, message)
+        loop.call_soon_threadsafe(finished.set)
+
+    threading.Thread(target=read_jobs, name="ai-worker-jobs", daemon=True).start()
+    await finished.wait()
+    if jobs:
+        await asyncio.gather(*jobs, return_exceptions=True)
+    listener.stop()
+
+
+if __name__ == '__main__':
+    asyncio.run(_serve())
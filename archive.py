@@ -0,0 +1,189 @@
+"""
+Streaming channel archive used before the monthly chat clear.
+
+The channel history is paged oldest-first and written as gzip-compressed JSON
+lines, one gzip member per page, so only one page is ever held in memory.
+After every page a checkpoint (last message ID, count, file offset) is saved;
+an interrupted archive resumes from there. The IDs collected while archiving
+are then used for the purge so the history isn't fetched a second time.
+"""
+import asyncio
+import gzip
+import json
+import os
+from array import array
+from datetime import datetime, timedelta, timezone
+
+import discord
+
+from bot_logging import event, report_exception
+
+# Messages fetched per history request (Discord's maximum)
+PAGE_SIZE = 100
+
+
+def message_to_dict(message):
+    """The archived fields of a message"""
+    return {
+        'id': message.id,
+        'created_at': message.created_at.isoformat(),
+        'edited_at': message.edited_at.isoformat() if message.edited_at else None,
+        'author_id': message.author.id,
+        'author': str(message.author),
+        'content': message.content,
+        'pinned': message.pinned,
+        'attachments': [{'filename': a.filename, 'url': a.url, 'size': a.size} for a in message.attachments],
+        'embeds': len(message.embeds),
+        'reference': message.reference.message_id if message.reference else None,
+    }
+
+
+async def iter_history(channel, after_id=None):
+    """Async generator over the channel history, oldest first, starting after `after_id`"""
+    after = discord.Object(id=after_id) if after_id else None
+    async for message in channel.history(limit=None, after=after, oldest_first=True):
+        yield message
+
+
+def _load_checkpoint(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _save_checkpoint(path, checkpoint):
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp, path)
+
+
+def _append_page(path, lines):
+    """Append one page as its own gzip member, returns the new file size"""
+    with gzip.open(path, 'ab') as f:
+        f.write(''.join(lines).encode('utf-8'))
+    return os.path.getsize(path)
+
+
+def _resume_file(path, offset):
+    """
+    Cut off anything written after the last checkpoint and return the IDs of the
+    unpinned messages already in the archive.
+    """
+    ids = array('q')
+    if not os.path.exists(path):
+        return ids
+    with open(path, 'r+b') as f:
+        f.truncate(offset)
+    if offset:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                entry = json.loads(line)
+                if not entry['pinned']:
+                    ids.append(entry['id'])
+    return ids
+
+
+async def archive_channel(channel, archive_dir):
+    """
+    Stream the whole channel history to `<archive_dir>/<channel>-<timestamp>.jsonl.gz`.
+    Returns (archive path, array of unpinned message IDs).
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+
+    # Resume an unfinished archive of this channel if there is one
+    checkpoint = None
+    prefix = f"{channel.id}-"
+    for name in sorted(os.listdir(archive_dir)):
+        if name.startswith(prefix) and name.endswith('.checkpoint.json'):
+            checkpoint = _load_checkpoint(os.path.join(archive_dir, name))
+            break
+    if checkpoint is None:
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')
+        path = os.path.join(archive_dir, f"{channel.id}-{stamp}.jsonl.gz")
+        checkpoint = {'path': path, 'last_id': None, 'count': 0, 'offset': 0}
+    path = checkpoint['path']
+    checkpoint_path = path + '.checkpoint.json'
+
+    ids = await asyncio.to_thread(_resume_file, path, checkpoint['offset'])
+    if checkpoint['count']:
+        event('archive', "Resuming archive", channel=channel.id, path=path, archived=checkpoint['count'])
+
+    page = []
+    async for message in iter_history(channel, checkpoint['last_id']):
+        page.append(json.dumps(message_to_dict(message), ensure_ascii=False) + '\n')
+        if not message.pinned:
+            ids.append(message.id)
+        checkpoint['last_id'] = message.id
+        if len(page) >= PAGE_SIZE:
+            checkpoint['offset'] = await asyncio.to_thread(_append_page, path, page)
+            checkpoint['count'] += len(page)
+            await asyncio.to_thread(_save_checkpoint, checkpoint_path, checkpoint)
+            page = []
+
+    if page:
+        checkpoint['offset'] = await asyncio.to_thread(_append_page, path, page)
+        checkpoint['count'] += len(page)
+        await asyncio.to_thread(_save_checkpoint, checkpoint_path, checkpoint)
+
+    event('archive', "Channel archived", channel=channel.id, path=path, archived=checkpoint['count'])
+    return path, ids
+
+
+async def delete_message_ids(channel, ids):
+    """
+    Delete messages by ID without fetching them again. Messages younger than
+    14 days are bulk deleted 100 at a time, older ones one by one (same rules
+    as TextChannel.purge). Returns the number of deleted messages.
+    """
+    bulk_cutoff = discord.utils.time_snowflake(datetime.now(timezone.utc) - timedelta(days=14, minutes=-1))
+    recent = [i for i in ids if i > bulk_cutoff]
+    old = [i for i in ids if i <= bulk_cutoff]
+    deleted = 0
+
+    for start in range(0, len(recent), 100):
+        chunk = recent[start:start + 100]
+        try:
+            if len(chunk) == 1:
+                await channel.get_partial_message(chunk[0]).delete()
+            else:
+                await channel.delete_messages([discord.Object(id=i) for i in chunk])
+            deleted += len(chunk)
+        except discord.HTTPException:
+            # Some of the messages are already gone, delete the rest one by one
+            old.extend(chunk)
+
+    for message_id in old:
+        try:
+            await channel.get_partial_message(message_id).delete()
+            deleted += 1
+        except discord.NotFound:
+            pass  # Already deleted
+        except discord.HTTPException:
+            report_exception('archive.delete_message', channel=channel.id, message=message_id)
+
+    return deleted
+
+
+async def archive_and_purge(channel, archive_dir):
+    """
+    Archive the channel, then delete every archived unpinned message and
+    whatever was posted after the archive finished.
+    Returns (archive path, number of deleted messages).
+    """
+    path, ids = await archive_channel(channel, archive_dir)
+    deleted = await delete_message_ids(channel, ids)
+    # Messages posted while archiving/deleting are not in the archive, clear them too
+    after = discord.Object(id=max(ids)) if ids else None
+    late = await channel.purge(limit=None, after=after, check=lambda m: not m.pinned)
+    if late:
+        event('archive', "Purged messages posted during the archive", channel=channel.id, count=len(late))
+    deleted += len(late)
+    # The clear is done, the next archive of this channel starts fresh
+    try:
+        os.remove(path + '.checkpoint.json')
+    except FileNotFoundError:
+        pass
+    return path, deleted
@@ -1,963 +1,113 @@
-import discord
-from discord.ext import commands, tasks
-import os
-import certifi
-import aiohttp
-import io
-import base64
-import re
-from flask import Flask
-from threading import Thread
-from datetime import datetime, timedelta
-from zoneinfo import ZoneInfo
-from dotenv import load_dotenv
-
-# Poland timezone (handles UTC+1/+2 automatically)
-POLAND_TZ = ZoneInfo("Europe/Warsaw")
-
-# Load environment variables
-load_dotenv()
+import time
 
-# Fix SSL certificate issues on macOS by setting cert file path
-os.environ['SSL_CERT_FILE'] = certifi.where()
-os.environ['REQUESTS_CA_BUNDLE'] = certifi.where()
+# Measured from here to the first on_ready, compared against !reload times
+PROCESS_STARTED = time.perf_counter()
 
-# Configure Gemini API key (for image analysis)
-gemini_api_key = os.getenv('GEMINI_API_KEY')
-if not gemini_api_key:
-    # Try reloading .env file
-    load_dotenv(override=True)
-    gemini_api_key = os.getenv('GEMINI_API_KEY')
+import discord
+from discord.ext import commands
+import os
+import signal
+import config
+import ai_workers
+from conversation_memory import ConversationMemory
+from outbox import NORMAL, Outbox
+from player_registry import PlayerRegistry
+from state_store import StateStore
+import bot_logging
+from bot_logging import log, setup_logging, event
+
+# Structured logging (see bot_logging.py), set up before anything logs
+log_listener = setup_logging()
 
 # Bot configuration
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True  # Required for member join events
 
-bot = commands.Bot(command_prefix='!', intents=intents)
 
-# Track processed events to prevent duplicates
-processed_members = set()
+class OutboxContext(commands.Context):
+    """Command context whose replies (`ctx.send`, errors included) go through the outbox"""
 
-# Chat clear scheduling
-chat_clear_enabled = True  # Set to False when !notclear is used
-target_channel_id = 1440064713584279632  # Channel to clear and send warnings
-warnings_sent = {'3days': False, '1day': False, '1hour': False, '1minute': False}  # Track sent warnings
+    async def send(self, content=None, **kwargs):
+        if self.interaction is not None:
+            return await super().send(content, **kwargs)
+        # Queued like any other NORMAL message, so they count against the channel's bucket
+        return await self.bot.outbox.send(self.channel, content, priority=NORMAL, **kwargs)
 
-# New Year countdown tracking
-new_year_1min_sent = False  # Track if 1-minute warning was sent
-new_year_countdown_sent = set()  # Track which countdown seconds were sent
 
+class Bot(commands.Bot):
+    async def get_context(self, origin, /, *, cls=OutboxContext):
+        return await super().get_context(origin, cls=cls)
 
-@bot.event
-async def on_ready():
-    print(f'{bot.user} has logged in and is ready!')
-    # Start the scheduled tasks
-    if not check_chat_clear.is_running():
-        check_chat_clear.start()
-    if not check_new_year.is_running():
-        check_new_year.start()
 
+bot = Bot(command_prefix='!', intents=intents)
 
-@tasks.loop(minutes=1)  # Check every minute for accurate 1-minute warnings
-async def check_chat_clear():
-    """Check if chat clear warnings or actual clear needs to happen"""
-    global chat_clear_enabled, warnings_sent
-    
-    try:
-        now = datetime.now(POLAND_TZ)
-        
-        # Calculate next 1st of month at 12:00 PM (noon)
-        if now.month == 12:
-            next_month = datetime(now.year + 1, 1, 1, 12, 0, 0, tzinfo=POLAND_TZ)
-        else:
-            next_month = datetime(now.year, now.month + 1, 1, 12, 0, 0, tzinfo=POLAND_TZ)
-        
-        days_until = (next_month - now).days
-        hours_until = (next_month - now).total_seconds() / 3600
-        
-        # Get the target channel for warnings and clearing
-        target_channel = bot.get_channel(target_channel_id)
-        
-        if not target_channel:
-            return  # Can't proceed without channel
-        
-        # Check if it's time to clear (1st of month, 12:00 PM / noon)
-        if now.day == 1 and now.hour == 12 and now.minute < 5:  # Check within first 5 minutes
-            if chat_clear_enabled:
-                try:
-                    # Delete all messages
-                    deleted = await target_channel.purge(limit=None, check=lambda m: not m.pinned)
-                    await target_channel.send(f"Chat cleared! Deleted {len(deleted)} messages.")
-                except discord.Forbidden:
-                    print("No permission to clear chat")
-                except Exception as e:
-                    print(f"Error clearing chat: {e}")
-            
-            # Reset for next month
-            chat_clear_enabled = True
-            warnings_sent = {'3days': False, '1day': False, '1hour': False, '1minute': False}
-        
-        # Check for warning dates (only if clear is enabled)
-        elif chat_clear_enabled:
-            # 3 days before (approximately 72 hours)
-            if 2.5 <= days_until <= 3.5 and not warnings_sent['3days']:
-                try:
-                    await target_channel.send(f"⚠️ Chat clear scheduled: 3 days remaining. Channel will be cleared on {next_month.strftime('%B 1st, %Y at %I:%M %p')}.")
-                    warnings_sent['3days'] = True
-                except:
-                    pass
-            
-            # 1 day before (approximately 24 hours)
-            elif 0.5 <= days_until <= 1.5 and not warnings_sent['1day']:
-                try:
-                    await target_channel.send(f"⚠️ Chat clear scheduled: 1 day remaining. Channel will be cleared on {next_month.strftime('%B 1st, %Y at %I:%M %p')}.")
-                    warnings_sent['1day'] = True
-                except:
-                    pass
-            
-            # 1 hour before (approximately 60 minutes)
-            elif 58 <= hours_until <= 62 and not warnings_sent['1hour']:
-                try:
-                    await target_channel.send(f"⚠️ Chat clear scheduled: 1 hour remaining. Channel will be cleared on {next_month.strftime('%B 1st, %Y at %I:%M %p')}.")
-                    warnings_sent['1hour'] = True
-                except:
-                    pass
-            
-            # 1 minute before (approximately 60 seconds)
-            elif 0.8 <= hours_until <= 1.2 and not warnings_sent['1minute']:
-                minutes_until = hours_until * 60
-                if 58 <= minutes_until <= 62:
-                    try:
-                        await target_channel.send(f"⚠️ Chat clear scheduled: 1 minute remaining. Channel will be cleared on {next_month.strftime('%B 1st, %Y at %I:%M %p')}.")
-                        warnings_sent['1minute'] = True
-                    except:
-                        pass
-            
-            # Reset warnings if more than 4 days away (new month cycle)
-            if days_until > 4:
-                warnings_sent = {'3days': False, '1day': False, '1hour': False, '1minute': False}
-    
-    except Exception as e:
-        print(f"Error in check_chat_clear: {e}")
+# Durable state (scheduler flags, dedup sets), read once here and written behind.
+# It lives on the bot so it survives reloads of the extensions that use it.
+state = StateStore(config.settings.state_db)
+state.load()
+bot.state = state
 
+# Verified players (Roblox username, level, rating), filled by !verify
+bot.players = PlayerRegistry(config.settings.players_db)
 
-@tasks.loop(seconds=1)  # Check every second for accurate countdown
-async def check_new_year():
-    """Check for New Year countdown and send messages"""
-    global new_year_1min_sent, new_year_countdown_sent
-    
-    try:
-        now = datetime.now(POLAND_TZ)
-        
-        # Get the target channel
-        target_channel = bot.get_channel(target_channel_id)
-        
-        if not target_channel:
-            return  # Can't proceed without channel
-        
-        # Check if it's December 31st
-        if now.month == 12 and now.day == 31:
-            # Calculate time until midnight (January 1st, 00:00:00)
-            next_year = datetime(now.year + 1, 1, 1, 0, 0, 0, tzinfo=POLAND_TZ)
-            time_until = (next_year - now).total_seconds()
-            
-            # 1 minute before (60 seconds)
-            if 59 <= time_until <= 61 and not new_year_1min_sent:
-                try:
-                    await target_channel.send("The New Year starts in 1 minute!")
-                    new_year_1min_sent = True
-                except:
-                    pass
-            
-            # Countdown from 10 seconds (send when we're at that second mark)
-            elif 0 <= time_until <= 10:
-                countdown_second = int(time_until)
-                # Send when we're at the exact second (e.g., between 10.0-10.99 for "10...")
-                if countdown_second <= 10 and countdown_second not in new_year_countdown_sent:
-                    try:
-                        if countdown_second == 0:
-                            await target_channel.send("0! Happy new year, Golden Rampant! Let this be a great year!")
-                        else:
-                            await target_channel.send(f"{countdown_second}...")
-                        new_year_countdown_sent.add(countdown_second)
-                    except:
-                        pass
-            
-            # Reset flags after New Year (January 1st, after 00:00:10)
-            if now.month == 1 and now.day == 1 and now.hour == 0 and now.minute == 0 and now.second > 10:
-                new_year_1min_sent = False
-                new_year_countdown_sent.clear()
-        else:
-            # Reset flags if not December 31st
-            if now.month != 12 or now.day != 31:
-                new_year_1min_sent = False
-                new_year_countdown_sent.clear()
-    
-    except Exception as e:
-        print(f"Error in check_new_year: {e}")
+# Everything the bot posts on its own goes through per-channel priority queues
+bot.outbox = Outbox()
 
+# !bot conversation memory per channel (recent turns + rolling summary, LRU-capped)
+bot.conversations = ConversationMemory(config.settings.chat_history_tokens,
+                                       max_total_tokens=config.settings.chat_memory_tokens)
 
-@bot.command(name='notclear')
-async def cancel_chat_clear(ctx):
-    """
-    Cancels the next scheduled chat clear.
-    
-    Usage: !notclear
-    """
-    global chat_clear_enabled, warnings_sent
-    
-    try:
-        # Check if command is used in a server (not DM)
-        if ctx.guild is None:
-            await ctx.send("❌ This command can only be used in a server, not in direct messages.")
-            return
-        
-        # Check if user has admin/manage server permissions
-        if not ctx.author.guild_permissions.manage_guild and not ctx.author.guild_permissions.administrator:
-            await ctx.send("❌ You don't have permission to use this command.")
-            return
-        
-        chat_clear_enabled = False
-        warnings_sent = {'3days': True, '1day': True, '1hour': True, '1minute': True}  # Mark as sent to prevent sending more
-        
-        # Calculate next 1st of month for confirmation
-        now = datetime.now(POLAND_TZ)
-        if now.month == 12:
-            next_month = datetime(now.year + 1, 1, 1, 12, 0, 0, tzinfo=POLAND_TZ)
-        else:
-            next_month = datetime(now.year, now.month + 1, 1, 12, 0, 0, tzinfo=POLAND_TZ)
-        
-        await ctx.send(f"✅ Chat clear cancelled. The scheduled clear on {next_month.strftime('%B 1st, %Y at %I:%M %p')} has been cancelled.")
-    
-    except Exception as e:
-        # Prevent propagation to on_command_error to avoid duplicate messages
-        pass
 
-
-@bot.command(name='yesclear')
-async def enable_chat_clear(ctx):
-    """
-    Re-enables the chat clear if it was cancelled with !notclear.
-    
-    Usage: !yesclear
-    """
-    global chat_clear_enabled, warnings_sent
-    
-    try:
-        # Check if command is used in a server (not DM)
-        if ctx.guild is None:
-            await ctx.send("❌ This command can only be used in a server, not in direct messages.")
-            return
-        
-        # Check if user has admin/manage server permissions
-        if not ctx.author.guild_permissions.manage_guild and not ctx.author.guild_permissions.administrator:
-            await ctx.send("❌ You don't have permission to use this command.")
-            return
-        
-        chat_clear_enabled = True
-        warnings_sent = {'3days': False, '1day': False, '1hour': False, '1minute': False}  # Reset warnings
-        
-        # Calculate next 1st of month for confirmation
-        now = datetime.now(POLAND_TZ)
-        if now.month == 12:
-            next_month = datetime(now.year + 1, 1, 1, 12, 0, 0, tzinfo=POLAND_TZ)
-        else:
-            next_month = datetime(now.year, now.month + 1, 1, 12, 0, 0, tzinfo=POLAND_TZ)
-        
-        await ctx.send(f"✅ Chat clear **RE-ENABLED**. The scheduled clear on {next_month.strftime('%B 1st, %Y at %I:%M %p')} is now active.")
-    
-    except Exception as e:
-        # Prevent propagation to on_command_error to avoid duplicate messages
-        pass
+def reload_config():
+    """Re-read .env into config.settings (SIGHUP / `!config reload`)"""
+    changed = config.reload_settings()
+    log.info("Configuration reloaded, changed: %s", ", ".join(changed) or "nothing")
+    pending = [name for name in changed if name in config.RESTART_ONLY]
+    if pending:
+        log.warning("Only applied after a restart: %s", ", ".join(pending))
+    return changed
 
 
 @bot.event
-async def on_member_join(member):
-    """
-    Welcomes new members to the server.
-    """
-    try:
-        # Prevent duplicate welcome messages
-        member_key = f"{member.id}_{member.guild.id}"
-        if member_key in processed_members:
-            return
-        processed_members.add(member_key)
-        
-        # Clean up old entries (keep last 1000)
-        if len(processed_members) > 1000:
-            processed_members.clear()
-        
-        # Assign guest role to new members
-        guest_role = discord.utils.get(member.guild.roles, name="guest")
-        if not guest_role:
-            guest_role = discord.utils.get(member.guild.roles, name="Guest")
-        
-        if guest_role:
-            try:
-                if member.guild.me.guild_permissions.manage_roles:
-                    if member.guild.me.top_role > guest_role:
-                        if guest_role not in member.roles:
-                            await member.add_roles(guest_role, reason="New member - assigned guest role")
-            except:
-                pass  # Silently fail if can't assign
-        
-        # Get the target welcome channel ID
-        welcome_channel_id = 1440064713584279632
-        welcome_channel = bot.get_channel(welcome_channel_id)
-        
-        if welcome_channel:
-            welcome_message = f"Welcome, {member.mention}!"
-            await welcome_channel.send(welcome_message)
-    except Exception as e:
-        # Silently fail if welcome message can't be sent
-        pass
-
-
-@bot.command(name='bot')
-async def bot_chat(ctx, *, message: str):
-    """
-    Chat with the bot using Gemini AI.
-    
-    Usage: !bot your message here
-    """
-    try:
-        # Check if command is used in a server (not DM)
-        if ctx.guild is None:
-            await ctx.send("❌ This command can only be used in a server, not in direct messages.")
-            return
-        
-        # Check for inappropriate content (only check for actual profanity, not common words)
-        bad_words = ['fuck', 'shit', 'damn', 'asshole', 'bitch', 'crap', 'piss off', 'bastard', 'slut', 'whore', 'nigger', 'nigga', 'retard', 'fag', 'faggot', 'cunt', 'dickhead', 'motherfucker']
-        message_lower = message.lower()
-        # Only flag if it's clearly profanity (word boundaries to avoid false positives)
-        bad_word_pattern = r'\b(' + '|'.join(re.escape(word) for word in bad_words) + r')\b'
-        if re.search(bad_word_pattern, message_lower):
-            await ctx.send("Hey! Don't be mean! That's not good to say this.")
-            return
-        
-        # Reload API key if needed
-        current_gemini_key = os.getenv('GEMINI_API_KEY')
-        if not current_gemini_key:
-            load_dotenv(override=True)
-            current_gemini_key = os.getenv('GEMINI_API_KEY')
-        
-        if not current_gemini_key:
-            await ctx.send("❌ Gemini API key not configured.")
-            return
-        
-        # Check for role mentions like "marshal"
-        if "marshal" in message_lower or "who is the marshal" in message_lower:
-            marshal_role = discord.utils.get(ctx.guild.roles, name="Marshal")
-            if not marshal_role:
-                marshal_role = discord.utils.get(ctx.guild.roles, name="marshal")
-            
-            if marshal_role:
-                # Find members with marshal role
-                members_with_role = [member.mention for member in ctx.guild.members if marshal_role in member.roles]
-                if members_with_role:
-                    await ctx.send(f"The Marshal is: {', '.join(members_with_role)}")
-                    return
-                else:
-                    await ctx.send("No one currently has the Marshal role.")
-                    return
-        
-        # Check for other role mentions
-        for role in ctx.guild.roles:
-            if role.name.lower() in message_lower and role.name.lower() not in ['everyone', 'here']:
-                members_with_role = [member.mention for member in ctx.guild.members if role in member.roles]
-                if members_with_role:
-                    role_info = f"The {role.name} role is held by: {', '.join(members_with_role)}"
-                    await ctx.send(role_info)
-                    return
-        
-        # Prepare context for Gemini
-        context = f"""You are a helpful bot in a Discord server called "The Golden Rampant" for the game "Bulwark".
-
-Server context:
-- Server name: The Golden Rampant
-- Game: Bulwark (on Roblox)
-- Server timezone: Europe (UTC+1/+2)
-- Chat clear schedule: The chat is automatically cleared on the 1st of every month at 12:00 PM (noon) in the server timezone (Europe, UTC+1/+2). Users receive warnings 3 days, 1 day, 1 hour, and 1 minute before the clear.
-
-About Bulwark:
-Bulwark is a Roblox game focused on medieval melee combat: swords, axes, halberds, shields and fist-fights. It plays like a skill-based dueling game (similar in feel to Chivalry / Mordhau), where spacing, timing and reading your opponent decide the outcome – not overpowered perks or magic spells.
-
-Map – island of Bulwark:
-- Town and market
-- Main dueling ground / arena
-- Church / temple area
-- Volcano with cave systems
-- Farms and bee farm
-- Coastline and small outer islets
-- Hidden tunnels and secret rooms
-
-NPCs: Guards, tavern NPCs, lords, the blacksmith, mysterious characters. Provide lore, atmosphere, and sometimes indirect hints about locations and secrets.
-
-Core gameplay: 1v1 duels, Free-for-all (FFA) fights, exploration of the island to find lore, weapons, armor and hidden skins. Emphasis on fair, skill-driven melee combat.
+async def setup_hook():
+    # Start writing state changes to disk in the background
+    state.start()
+    # `kill -HUP <pid>` reloads the configuration (not available on Windows)
+    if hasattr(signal, 'SIGHUP'):
+        bot.loop.add_signal_handler(signal.SIGHUP, reload_config)
+    # Gemini work in separate processes if AI_WORKERS is set
+    ai_workers.start(config.settings.ai_workers)
+    for extension in config.EXTENSIONS:
+        await bot.load_extension(extension)
 
-Weapon System:
-Weapons have distinct damage, range, windup/release/recovery timings, stamina consumption, and sometimes special behaviors.
 
-Common weapon categories:
-- Longsword: Balanced range and speed, great for beginners
-- Halberd: Long reach, slower swings, good for controlling distance and punishing whiffs
-- Billhook: Medium/long reach with a hooked blade, unusual swing arcs
-- Stiletto / Daggers: Short range, very fast, for aggressive players
-- Axes (Executioner's Axe, Hatchet, etc.): High damage, slower and heavier, reward prediction
-- Fists: No weapon; mainly for fun and flex, can still be dangerous with perfect spacing
+@bot.before_invoke
+async def start_command_timer(ctx):
+    ctx.started_at = time.perf_counter()
 
-Most weapons have base versions (bought from blacksmith shop for Sheldons) and special skins (secret or cosmetic variants, typically share same stats, obtained through exploration).
 
-Secret Weapon Skins:
+@bot.after_invoke
+async def log_command(ctx):
+    """One structured `command` event per invocation (sampleable via LOG_SAMPLE_RATES)"""
+    started_at = getattr(ctx, 'started_at', None)
+    duration_ms = round((time.perf_counter() - started_at) * 1000, 1) if started_at else None
+    event('command', "Command finished", ctx, duration_ms=duration_ms)
 
-Orphic Sickle (Sickle Skin):
-- Cosmetic skin for the Sickle
-- Location: Hidden room behind a bush near the town gate by the shop
-- How to get it: Go to town/shop area, find the gate area with a normal-looking bush, walk directly into the bush to phase into a hidden cave room. Inside you'll see a table, lantern, barrel, and a sickle lying on the table. Interact with the sickle to unlock Orphic Sickle skin.
-- Orphic Sickle does not significantly change stats – it is a cosmetic flex
 
-Ancient Hatchet (Hatchet Skin):
-- Cosmetic skin for the Hatchet
-- Location: Sinachucu Caverns under the volcano
-- How to get it: Travel to the far side of the island, near or under the volcano. Find the entrance to Sinachucu Caverns – humid caves under the volcano. Inside, look for a small steaming pool and multiple branching corridors. In one of those side tunnels you'll find a skeleton with an arm chopped off by a hatchet, the hatchet stuck in the bones. Interact with this hatchet to unlock Ancient Hatchet skin.
-- Ancient Hatchet is again a cosmetic reskin
-
-Other Secrets and Potential Future Weapon Spots:
-- Mysterious Buttons: Small circular protrusions that appeared on the map, purpose remains uncertain
-- Warkade Machine: Hidden arcade machine deep in the volcano caves, currently more of a novelty/flex
-- Hidden Stone Door: Giant stone door near the bee farm, emitting white particles, seems to lead into large underground space but entrance is blocked by rock
-- Hidden Tunnels: Some houses in town area have tunnels underneath them, lead to lower cave areas
-- Rusty Car: Rusted car frame on an island near the church, completely out of place in medieval world
-
-Weapon Skins and Gameplay:
-- Base weapons: Bought from shop, define playstyle (range, speed, stamina use). Used to learn spacing, parries, blocks, feints, timing, stamina management
-- Secret skins: Typically cosmetic reskins, do not fundamentally change balance or give unfair advantages. Function as proof of exploration, style/flex, collectibles tied to specific lore and locations
-- You do not need secret skins to be powerful in combat, but having them makes you stand out and signals you know the game's world and secrets
-
-Two rival empires compete: Guesmand and Sunderland. Players compete in tournaments.
-
-Important rules:
-- Do NOT generate images
-- Do NOT say odd or inappropriate things
-- Be helpful and friendly
-- Keep responses concise and relevant
-- If asked about roles, mention that you can check who has specific roles
-- If someone greets you (says hello, hi, etc.), respond with "Welcome to The Golden Rampant! How can I help?"
-- If asked what AI model you are or what model you use, say you're just a helpful bot and don't reveal technical details
-- Never mention Gemini, Google, AI models, or technical implementation details
-- When discussing Bulwark, you can provide information about weapons, secrets, locations, and gameplay mechanics based on the knowledge provided
-- Do not mention in greetings that you know about Bulwark details – keep greeting simple and friendly
-
-User's message: {message}
-
-Respond naturally and helpfully, but keep it short and appropriate."""
-        
-        # Use Gemini API to generate response (same approach as verify command)
-        try:
-            headers = {
-                'Content-Type': 'application/json',
-            }
-            
-            data = {
-                "contents": [{
-                    "parts": [{"text": context}]
-                }],
-                "generationConfig": {
-                    "temperature": 0.7,
-                    "maxOutputTokens": 500,
-                }
-            }
-            
-            # First, try to list available models (exact same approach as verify command)
-            available_model = None
-            try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(
-                        f"https://generativelanguage.googleapis.com/v1beta/models?key={current_gemini_key}",
-                        headers=headers
-                    ) as resp:
-                        if resp.status == 200:
-                            models_result = await resp.json()
-                            if 'models' in models_result:
-                                # Find a model that supports generateContent
-                                for model in models_result['models']:
-                                    name = model.get('name', '')
-                                    methods = model.get('supportedGenerationMethods', [])
-                                    if 'generateContent' in methods:
-                                        # Prefer vision models (or any working model)
-                                        if 'vision' in name.lower() or '1.5' in name.lower() or 'flash' in name.lower():
-                                            available_model = name.split('/')[-1]
-                                            break
-                                        elif not available_model:
-                                            available_model = name.split('/')[-1]
-            except:
-                pass
-            
-            # Try different models and API versions (exact same as verify command)
-            models_to_try = []
-            if available_model:
-                models_to_try.append(available_model)
-            
-            # Add common model names
-            models_to_try.extend([
-                "gemini-1.5-flash",
-                "gemini-1.5-pro",
-            ])
-            
-            response_text = None
-            last_error = None
-            
-            for model_name in models_to_try:
-                # Try both v1beta and v1
-                for api_version in ["v1beta", "v1"]:
-                    try:
-                        endpoint = f"https://generativelanguage.googleapis.com/{api_version}/models/{model_name}:generateContent?key={current_gemini_key}"
-                        async with aiohttp.ClientSession() as session:
-                            async with session.post(endpoint, headers=headers, json=data) as resp:
-                                if resp.status == 200:
-                                    result = await resp.json()
-                                    if 'candidates' in result and len(result['candidates']) > 0:
-                                        if 'content' in result['candidates'][0]:
-                                            if 'parts' in result['candidates'][0]['content']:
-                                                response_text = result['candidates'][0]['content']['parts'][0]['text']
-                                                break
-                                else:
-                                    error_text = await resp.text()
-                                    last_error = f"Status {resp.status}: {error_text[:200]}"
-                                    continue
-                    except Exception as e:
-                        last_error = str(e)
-                        continue
-                if response_text:
-                    break
-            
-            if response_text:
-                # Check response for inappropriate content (with word boundaries)
-                response_lower = response_text.lower()
-                bad_word_pattern = r'\b(' + '|'.join(re.escape(word) for word in bad_words) + r')\b'
-                if re.search(bad_word_pattern, response_lower):
-                    await ctx.send("Hey! Don't be mean! That's not good to say this.")
-                    return
-                
-                # Send response (limit to 2000 characters for Discord)
-                if len(response_text) > 2000:
-                    response_text = response_text[:1997] + "..."
-                await ctx.send(response_text)
-                return  # Explicit return to prevent any duplicate sending
-            else:
-                error_msg = "Sorry, I couldn't generate a response right now."
-                if last_error:
-                    error_msg += f" Error: {last_error}"
-                await ctx.send(error_msg)
-                return  # Explicit return to prevent any duplicate sending
-                
-        except Exception as e:
-            await ctx.send(f"Error: {str(e)}")
-            return  # Explicit return to prevent any duplicate sending
-            
-    except Exception as e:
-        # Prevent propagation to on_command_error to avoid duplicate messages
-        pass
-
-
-@bot.command(name='sendmessage')
-async def send_message(ctx, channel_name: str, *, message_text: str):
-    """
-    Sends a message to a specified channel.
-    
-    Usage: !sendmessage channel_name message_text
-    
-    Example: !sendmessage general Hello everyone!
-    """
-    try:
-        # Check if command is used in a server (not DM)
-        if ctx.guild is None:
-            await ctx.send("❌ This command can only be used in a server, not in direct messages.")
-            return
-        
-        # Find the channel by name (case-insensitive)
-        channel = discord.utils.get(ctx.guild.channels, name=channel_name)
-        
-        if channel is None:
-            await ctx.send(f"❌ Channel '{channel_name}' not found. Please check the channel name and try again.")
-            return
-        
-        # Check if bot has permission to send messages in that channel
-        if not channel.permissions_for(ctx.guild.me).send_messages:
-            await ctx.send(f"❌ I don't have permission to send messages in {channel.mention}")
-            return
-        
-        # Send the message to the specified channel
-        try:
-            await channel.send(message_text)
-            await ctx.send(f"✅ Message sent to {channel.mention}!")
-        except discord.Forbidden:
-            await ctx.send(f"❌ I don't have permission to send messages in that channel.")
-        except Exception as e:
-            await ctx.send(f"❌ An error occurred: {str(e)}")
-            
-    except Exception as e:
-        # Prevent propagation to on_command_error to avoid duplicate messages
-        pass
-
-
-@bot.command(name='clear')
-async def clear_chat(ctx):
-    """
-    Manually clears the chat channel.
-    
-    Usage: !clear
-    """
-    try:
-        # Check if command is used in a server (not DM)
-        if ctx.guild is None:
-            await ctx.send("❌ This command can only be used in a server, not in direct messages.")
-            return
-        
-        # Check if user has admin/manage server or manage messages permission
-        if not (ctx.author.guild_permissions.manage_guild or 
-                ctx.author.guild_permissions.administrator or 
-                ctx.author.guild_permissions.manage_messages):
-            await ctx.send("❌ You don't have permission to use this command.")
-            return
-        
-        # Get the target channel ID
-        clear_channel_id = 1440064713584279632
-        clear_channel = bot.get_channel(clear_channel_id)
-        
-        if not clear_channel:
-            await ctx.send("❌ Could not find the target channel.")
-            return
-        
-        # Check if bot has permission to manage messages
-        if not clear_channel.permissions_for(ctx.guild.me).manage_messages:
-            await ctx.send("❌ I don't have permission to clear messages in that channel.")
-            return
-        
-        # Clear the channel (delete all messages, keeping pinned messages)
-        try:
-            deleted = await clear_channel.purge(limit=None, check=lambda m: not m.pinned)
-            await ctx.send(f"✅ Chat cleared! Deleted {len(deleted)} messages.")
-        except discord.Forbidden:
-            await ctx.send("❌ I don't have permission to delete messages in that channel.")
-        except Exception as e:
-            await ctx.send(f"❌ Error clearing chat: {str(e)}")
-            
-    except Exception as e:
-        # Prevent propagation to on_command_error to avoid duplicate messages
-        pass
-
-
-@bot.command(name='nextclear')
-async def next_clear_info(ctx):
-    """
-    Shows when the next chat clear is scheduled.
-    
-    Usage: !nextclear
-    """
-    try:
-        # Check if command is used in a server (not DM)
-        if ctx.guild is None:
-            await ctx.send("❌ This command can only be used in a server, not in direct messages.")
-            return
-        
-        global chat_clear_enabled
-        
-        now = datetime.now(POLAND_TZ)
-        
-        # Calculate next 1st of month (this month) at 12:00 PM (noon)
-        if now.month == 12:
-            next_month = datetime(now.year + 1, 1, 1, 12, 0, 0, tzinfo=POLAND_TZ)
-        else:
-            next_month = datetime(now.year, now.month + 1, 1, 12, 0, 0, tzinfo=POLAND_TZ)
-        
-        # Calculate the month after that (in case current is cancelled)
-        if next_month.month == 12:
-            month_after = datetime(next_month.year + 1, 1, 1, 12, 0, 0, tzinfo=POLAND_TZ)
-        else:
-            month_after = datetime(next_month.year, next_month.month + 1, 1, 12, 0, 0, tzinfo=POLAND_TZ)
-        
-        if chat_clear_enabled:
-            # Clear is enabled, show next clear
-            days_until = (next_month - now).days
-            hours_until = (next_month - now).total_seconds() / 3600
-            await ctx.send(f"📅 Next chat clear: **{next_month.strftime('%B 1st, %Y at %I:%M %p')}**\n"
-                          f"⏰ Time remaining: {days_until} day(s) ({int(hours_until)} hours)")
-        else:
-            # Clear is cancelled, show cancelled month and next active one
-            days_until_next = (next_month - now).days
-            days_until_after = (month_after - now).days
-            hours_until_after = (month_after - now).total_seconds() / 3600
-            
-            await ctx.send(f"❌ Chat clear is **CANCELLED** for {next_month.strftime('%B 1st, %Y at %I:%M %p')}.\n\n"
-                          f"📅 Next active chat clear: **{month_after.strftime('%B 1st, %Y at %I:%M %p')}**\n"
-                          f"⏰ Time remaining: {days_until_after} day(s) ({int(hours_until_after)} hours)")
-            
-    except Exception as e:
-        # Prevent propagation to on_command_error to avoid duplicate messages
-        pass
-
-
-@bot.command(name='verify')
-async def verify_user(ctx):
-    """
-    Analyzes an image to extract Roblox username, level, and rating.
-    Then sends a formatted message and assigns the peasant role.
-    
-    Usage: !verify (with an image attached)
-    """
-    try:
-        # Check if command is used in a server (not DM)
-        if ctx.guild is None:
-            await ctx.send("❌ This command can only be used in a server, not in direct messages.")
-            return
-        
-        # Check if user already has peasant role
-        peasant_role = discord.utils.get(ctx.guild.roles, name="peasant")
-        if not peasant_role:
-            # Try case-insensitive search
-            peasant_role = discord.utils.get(ctx.guild.roles, name="Peasant")
-        if not peasant_role:
-            # Try other variations
-            for role in ctx.guild.roles:
-                if role.name.lower() == "peasant":
-                    peasant_role = role
-                    break
-        
-        if peasant_role and peasant_role in ctx.author.roles:
-            await ctx.send("✅ You are already verified!")
-            return
-        
-        # Check if message has attachments
-        if not ctx.message.attachments:
-            await ctx.send("❌ Please attach an image with the `!verify` command.")
-            return
-        
-        # Get the first image attachment
-        attachment = ctx.message.attachments[0]
-        
-        # Check if it's an image
-        if not attachment.content_type or not attachment.content_type.startswith('image/'):
-            await ctx.send("❌ Please attach a valid image file.")
-            return
-        
-        # Download the image
-        await ctx.send("🔍 Analyzing image...")
-        async with aiohttp.ClientSession() as session:
-            async with session.get(attachment.url) as resp:
-                if resp.status == 200:
-                    image_data = await resp.read()
-                else:
-                    await ctx.send("❌ Failed to download the image.")
-                    return
-        
-        # Analyze image with Gemini API
-        # Reload API key in case it wasn't loaded initially
-        current_gemini_key = os.getenv('GEMINI_API_KEY')
-        if not current_gemini_key:
-            load_dotenv(override=True)
-            current_gemini_key = os.getenv('GEMINI_API_KEY')
-        
-        if not current_gemini_key:
-            await ctx.send("❌ Gemini API key not configured. Please add GEMINI_API_KEY to your .env file.")
-            return
-        
-        gemini_api_key = current_gemini_key
-        
-        try:
-            # Use Gemini via HTTP API directly
-            image_base64 = base64.b64encode(image_data).decode('utf-8')
-            headers = {
-                'Content-Type': 'application/json',
-            }
-            
-            # First, try to list available models
-            available_model = None
-            try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(
-                        f"https://generativelanguage.googleapis.com/v1beta/models?key={gemini_api_key}",
-                        headers=headers
-                    ) as resp:
-                        if resp.status == 200:
-                            models_result = await resp.json()
-                            if 'models' in models_result:
-                                # Find a model that supports generateContent
-                                for model in models_result['models']:
-                                    name = model.get('name', '')
-                                    methods = model.get('supportedGenerationMethods', [])
-                                    if 'generateContent' in methods:
-                                        # Prefer vision models
-                                        if 'vision' in name.lower() or '1.5' in name.lower() or 'flash' in name.lower():
-                                            available_model = name.split('/')[-1]
-                                            break
-                                        elif not available_model:
-                                            available_model = name.split('/')[-1]
-            except:
-                pass  # If listing fails, we'll try hardcoded models
-            
-            # Prepare the request data
-            data = {
-                "contents": [{
-                    "parts": [
-                        {"text": "Analyze this Roblox screenshot and extract: 1) Username on Roblox (name above/near character), 2) Level (number after 'Level:'), 3) Rating (number after 'Rating:'). Respond ONLY in format:\nUsername: [username]\nLevel: [level]\nRating: [rating]"},
-                        {
-                            "inline_data": {
-                                "mime_type": attachment.content_type or "image/png",
-                                "data": image_base64
-                            }
-                        }
-                    ]
-                }]
-            }
-            
-            # Try different models and API versions
-            models_to_try = []
-            if available_model:
-                models_to_try.append(available_model)
-            
-            # Add common model names
-            models_to_try.extend([
-                "gemini-1.5-flash",
-                "gemini-1.5-pro",
-                "gemini-pro",
-            ])
-            
-            analysis_text = None
-            last_error = None
-            
-            for model_name in models_to_try:
-                # Try both v1beta and v1
-                for api_version in ["v1beta", "v1"]:
-                    try:
-                        endpoint = f"https://generativelanguage.googleapis.com/{api_version}/models/{model_name}:generateContent?key={gemini_api_key}"
-                        async with aiohttp.ClientSession() as session:
-                            async with session.post(endpoint, headers=headers, json=data) as resp:
-                                if resp.status == 200:
-                                    result = await resp.json()
-                                    if 'candidates' in result and len(result['candidates']) > 0:
-                                        if 'content' in result['candidates'][0]:
-                                            if 'parts' in result['candidates'][0]['content']:
-                                                analysis_text = result['candidates'][0]['content']['parts'][0]['text']
-                                                break
-                                else:
-                                    error_text = await resp.text()
-                                    last_error = f"Status {resp.status}: {error_text[:200]}"
-                                    continue
-                    except Exception as e:
-                        last_error = str(e)
-                        continue
-                if analysis_text:
-                    break
-            
-            if not analysis_text:
-                error_msg = "Could not analyze image with Gemini API. "
-                if last_error:
-                    error_msg += f"Last error: {last_error}. "
-                error_msg += "Tried listing models and common model names. Please check your API key has vision access."
-                raise Exception(error_msg)
-                
-        except Exception as gemini_error:
-            await ctx.send(f"❌ Error analyzing image with Gemini: {str(gemini_error)}")
-            return
-        
-        # Parse the response
-        username = "N/A"
-        level = "N/A"
-        rating = "N/A"
-        
-        if analysis_text:
-            for line in analysis_text.split('\n'):
-                if 'Username:' in line:
-                    username = line.split('Username:')[1].strip()
-                elif 'Level:' in line:
-                    level = line.split('Level:')[1].strip()
-                elif 'Rating:' in line:
-                    rating = line.split('Rating:')[1].strip()
-        
-        # Find roles
-        peasant_role = discord.utils.get(ctx.guild.roles, name="peasant")
-        if not peasant_role:
-            peasant_role = discord.utils.get(ctx.guild.roles, name="Peasant")
-        if not peasant_role:
-            for role in ctx.guild.roles:
-                if role.name.lower() == "peasant":
-                    peasant_role = role
-                    break
-        
-        member_role = discord.utils.get(ctx.guild.roles, name="member")
-        if not member_role:
-            member_role = discord.utils.get(ctx.guild.roles, name="Member")
-        if not member_role:
-            for role in ctx.guild.roles:
-                if role.name.lower() == "member":
-                    member_role = role
-                    break
-        
-        guest_role = discord.utils.get(ctx.guild.roles, name="guest")
-        if not guest_role:
-            guest_role = discord.utils.get(ctx.guild.roles, name="Guest")
-        if not guest_role:
-            for role in ctx.guild.roles:
-                if role.name.lower() == "guest":
-                    guest_role = role
-                    break
-        
-        # Assign roles after verification
-        if peasant_role:
-            try:
-                if ctx.guild.me.guild_permissions.manage_roles:
-                    # Assign peasant role
-                    if ctx.guild.me.top_role > peasant_role:
-                        if peasant_role not in ctx.author.roles:
-                            await ctx.author.add_roles(peasant_role, reason="Verified via !verify command")
-                    
-                    # Assign member role if it exists
-                    if member_role and ctx.guild.me.top_role > member_role:
-                        if member_role not in ctx.author.roles:
-                            await ctx.author.add_roles(member_role, reason="Verified via !verify command")
-                    
-                    # Remove guest role if it exists and user has it
-                    if guest_role and ctx.guild.me.top_role > guest_role:
-                        if guest_role in ctx.author.roles:
-                            await ctx.author.remove_roles(guest_role, reason="Verified - guest role removed")
-            except discord.Forbidden:
-                pass  # Silently fail if no permission
-            except Exception as e:
-                pass  # Silently fail on error
-        
-        # Get the target channel ID
-        target_channel_id = 1440062982901207164
-        target_channel = bot.get_channel(target_channel_id)
-        
-        if not target_channel:
-            await ctx.send("❌ Could not find the target channel.")
-            return
-        
-        # Format the message according to specification
-        formatted_message = f"""Username on Roblox: {username}
-Level: {level}
-Rating: {rating}
-Proof: 
-{peasant_role.mention if peasant_role else "@Peasant"} {ctx.author.mention}"""
-        
-        # Send to the target channel with the image attached
-        # Create a Discord file object from the image data
-        image_file = discord.File(io.BytesIO(image_data), filename=f"verification_{ctx.author.id}.png")
-        await target_channel.send(formatted_message, file=image_file)
-        
-        # Confirm to user in the channel they used
-        await ctx.send("✅ Verification complete! Message sent to the verification channel.")
-            
-    except Exception as e:
-        # Prevent propagation to on_command_error to avoid duplicate messages
-        # Most errors are already handled above with specific messages
-        pass
+@bot.event
+async def on_ready():
+    if not hasattr(bot, 'startup_seconds'):
+        bot.startup_seconds = time.perf_counter() - PROCESS_STARTED
+    log.info("%s has logged in and is ready! (startup took %.1f s)", bot.user, bot.startup_seconds)
 
 
 @bot.event
 async def on_command_error(ctx, error):
+    if not isinstance(error, commands.CommandNotFound):
+        log.warning("Command error: %s", error, exc_info=error,
+                    extra={'category': 'error', 'rate_key': ('on_command_error', type(error).__name__),
+                           **bot_logging.context_fields(ctx)})
     if isinstance(error, commands.MissingRequiredArgument):
         await ctx.send("❌ Invalid command format. Usage: `!sendmessage channel_name message_text`\n"
                       "Example: `!sendmessage general Hello everyone!`")
@@ -967,31 +117,25 @@ async def on_command_error(ctx, error):
         await ctx.send(f"❌ An error occurred: {str(error)}")
 
 
-# Create Flask app for UptimeRobot health check
-app = Flask(__name__)
-
-@app.route('/')
-@app.route('/health')
-@app.route('/uptime')
-def health_check():
-    """Health check endpoint for UptimeRobot"""
-    return "ok", 200
-
-def run_flask():
-    """Run Flask server in a separate thread"""
-    app.run(host='0.0.0.0', port=8080, debug=False)
-
 # Run the bot
 if __name__ == '__main__':
+    # Fix SSL certificate issues on macOS by setting cert file path
+    import certifi
+    os.environ['SSL_CERT_FILE'] = certifi.where()
+    os.environ['REQUESTS_CA_BUNDLE'] = certifi.where()
+    
     # Start Flask server in a separate thread
-    flask_thread = Thread(target=run_flask, daemon=True)
-    flask_thread.start()
-    print("✅ Health check server started on http://0.0.0.0:8080")
+    import health_server
+    health_server.start(bot)
     
-    token = os.getenv('DISCORD_BOT_TOKEN')
+    token = config.settings.discord_bot_token
     if not token:
-        print("❌ ERROR: DISCORD_BOT_TOKEN not found in environment variables!")
-        print("Please create a .env file with your bot token.")
+        log.error("DISCORD_BOT_TOKEN not found in environment variables! "
+                  "Please create a .env file with your bot token.")
     else:
-        bot.run(token)
-
+        # Our queue-based logging is already installed, don't let discord.py add its own handler
+        bot.run(token, log_handler=None)
+    ai_workers.stop()
+    state.close()
+    bot.players.close()
+    log_listener.stop()
@@ -0,0 +1,196 @@
+"""
+Structured, non-blocking logging for the bot.
+
+Records are put on an in-memory queue by a QueueHandler (never touches I/O on
+the event loop) and written as JSON lines by a QueueListener thread.
+
+Configuration (environment):
+  LOG_LEVEL          - minimum level, default INFO
+  LOG_FILE           - optional file to append JSON lines to (stdout otherwise)
+  LOG_SAMPLE_RATES   - per-category sampling, e.g. "command=0.25,gateway=0.05"
+  LOG_ERROR_INTERVAL - seconds between repeats of the same swallowed exception, default 60
+"""
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+log = logging.getLogger("rampart")
+
+# Extra fields copied from the record into the JSON line when present
+_FIELDS = ('category', 'command', 'guild', 'user', 'channel', 'duration_ms', 'suppressed')
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for field in _FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        data = getattr(record, 'data', None)
+        if data:
+            entry.update(data)
+        if record.exc_info:
+            exc_type, exc, _ = record.exc_info
+            entry['exception'] = {
+                'type': exc_type.__name__ if exc_type else None,
+                'message': str(exc),
+                'traceback': self.formatException(record.exc_info),
+            }
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Drops a fraction of records per category. Warnings and errors are never sampled.
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(getattr(record, 'category', None))
+        return rate is None or random.random() < rate
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets the same (location, exception type) through at most once per
+    interval. The number of suppressed repeats is attached to the next record
+    that gets through.
+    """
+
+    def __init__(self, interval):
+        super().__init__()
+        self.interval = interval
+        self._last = {}
+        self._suppressed = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = getattr(record, 'rate_key', None)
+        if key is None:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            last = self._last.get(key)
+            if last is not None and now - last < self.interval:
+                self._suppressed[key] = self._suppressed.get(key, 0) + 1
+                return False
+            self._last[key] = now
+            suppressed = self._suppressed.pop(key, 0)
+            if len(self._last) > 1000:
+                # Forget keys that have been quiet for a while
+                self._last = {k: v for k, v in self._last.items() if now - v < self.interval}
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class _LoopQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that formats tracebacks on the listener thread instead of the caller"""
+
+    def prepare(self, record):
+        # Resolve the message now (args may change later) but keep exc_info for the formatter
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def _parse_rates(value):
+    rates = {}
+    for part in (value or '').split(','):
+        if '=' not in part:
+            continue
+        name, rate = part.split('=', 1)
+        try:
+            rates[name.strip()] = max(0.0, min(1.0, float(rate)))
+        except ValueError:
+            continue
+    return rates
+
+
+def _float(name, default):
+    """Like config._int: blank or invalid values fall back to the default"""
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def setup_logging():
+    """
+    Route all logging (ours and discord.py's) through a queue to a background
+    JSON writer. Returns the started QueueListener.
+    """
+    level = getattr(logging, os.getenv('LOG_LEVEL', 'INFO').upper(), logging.INFO)
+    log_file = os.getenv('LOG_FILE')
+
+    if log_file:
+        output = logging.FileHandler(log_file, encoding='utf-8')
+    else:
+        output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _LoopQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(_parse_rates(os.getenv('LOG_SAMPLE_RATES'))))
+    queue_handler.addFilter(RateLimitFilter(_float('LOG_ERROR_INTERVAL', 60.0)))
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def context_fields(ctx):
+    """Command/guild/user/channel fields for a commands.Context (or None)"""
+    if ctx is None:
+        return {}
+    return {
+        'command': ctx.command.qualified_name if ctx.command else None,
+        'guild': ctx.guild.id if ctx.guild else None,
+        'user': ctx.author.id if ctx.author else None,
+        'channel': ctx.channel.id if ctx.channel else None,
+    }
+
+
+def report_exception(where, ctx=None, level=logging.ERROR, **data):
+    """
+    Report an exception that is otherwise swallowed. Must be called from inside
+    an `except` block. Repeats of the same error from the same place are rate limited.
+    """
+    exc_type = sys.exc_info()[0]
+    extra = context_fields(ctx)
+    extra['category'] = 'error'
+    extra['rate_key'] = (where, exc_type.__name__ if exc_type else None)
+    extra['data'] = dict(data, where=where)
+    log.log(level, "Error in %s", where, exc_info=True, extra=extra)
+
+
+def event(category, message, ctx=None, **data):
+    """Log an informational event in a (sampleable) category"""
+    extra = context_fields(ctx)
+    extra['category'] = category
+    extra['data'] = data
+    log.info(message, extra=extra)
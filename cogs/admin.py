@@ -0,0 +1,218 @@
+"""
+Admin tools: profiling the live process and reloading extensions in place.
+"""
+import io
+import time
+from datetime import datetime
+
+import discord
+from discord.ext import commands
+
+import ai_workers
+import config
+from bot_logging import event, log, report_exception
+from config import EXTENSIONS, MAX_PROFILE_SECONDS, POLAND_TZ
+
+
+class Admin(commands.Cog):
+    """!profile, !reload, !config and !outbox"""
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    @commands.command(name='profile')
+    async def profile_bot(self, ctx, action: str = None, *args):
+        """
+        Profiles the live bot process and returns the results as files.
+
+        Usage:
+          !profile sample [seconds]   - sampling profiler, collapsed stacks for flamegraphs
+          !profile cprofile [seconds] - cProfile report and .prof dump
+          !profile mem start|snapshot|diff|stop - tracemalloc snapshots and diffs
+          !profile tasks              - all pending asyncio tasks with their stacks
+        """
+        # cProfile/tracemalloc helpers are only loaded once someone profiles
+        import profiler
+
+        try:
+            # Check if command is used in a server (not DM)
+            if ctx.guild is None:
+                await ctx.send("❌ This command can only be used in a server, not in direct messages.")
+                return
+
+            # Admin only
+            if not ctx.author.guild_permissions.administrator:
+                await ctx.send("❌ You don't have permission to use this command.")
+                return
+
+            if action in ('sample', 'cprofile'):
+                try:
+                    seconds = float(args[0]) if args else 10.0
+                except ValueError:
+                    await ctx.send("❌ Duration must be a number of seconds.")
+                    return
+                seconds = max(1.0, min(seconds, MAX_PROFILE_SECONDS))
+
+                if profiler._profile_lock.locked():
+                    await ctx.send("❌ A profile is already running, try again when it finishes.")
+                    return
+
+                await ctx.send(f"⏱️ Profiling for {seconds:g} seconds...")
+                stamp = datetime.now(POLAND_TZ).strftime('%Y%m%d-%H%M%S')
+                if action == 'sample':
+                    collapsed, sample_count = await profiler.sample(seconds)
+                    await ctx.send(f"✅ Collected {sample_count} samples.",
+                                   file=discord.File(io.BytesIO(collapsed), filename=f"profile-{stamp}.collapsed"))
+                else:
+                    report, dump = await profiler.cprofile(seconds)
+                    await ctx.send("✅ cProfile finished.",
+                                   files=[discord.File(io.BytesIO(report), filename=f"cprofile-{stamp}.txt"),
+                                          discord.File(io.BytesIO(dump), filename=f"cprofile-{stamp}.prof")])
+
+            elif action == 'mem':
+                sub = args[0] if args else 'snapshot'
+                if sub == 'start':
+                    await ctx.send(f"✅ tracemalloc started. {profiler.memory_start()}")
+                elif sub == 'snapshot':
+                    await ctx.send(f"✅ {profiler.memory_snapshot()}")
+                elif sub == 'diff':
+                    report = profiler.memory_diff()
+                    if report is None:
+                        await ctx.send("❌ Need at least two snapshots. Use `!profile mem snapshot` first.")
+                        return
+                    await ctx.send("✅ Memory diff between the last two snapshots:",
+                                   file=discord.File(io.BytesIO(report), filename="tracemalloc-diff.txt"))
+                elif sub == 'stop':
+                    profiler.memory_stop()
+                    await ctx.send("✅ tracemalloc stopped.")
+                else:
+                    await ctx.send("❌ Usage: `!profile mem start|snapshot|diff|stop`")
+
+            elif action == 'tasks':
+                await ctx.send("✅ Pending asyncio tasks:",
+                               file=discord.File(io.BytesIO(profiler.dump_tasks()), filename="asyncio-tasks.txt"))
+
+            else:
+                await ctx.send("❌ Usage: `!profile sample|cprofile [seconds]`, `!profile mem start|snapshot|diff|stop` or `!profile tasks`")
+
+        except Exception as e:
+            # Prevent propagation to on_command_error to avoid duplicate messages
+            report_exception('profile_bot', ctx)
+
+    @commands.command(name='reload')
+    async def reload_extensions(self, ctx, *names):
+        """
+        Reloads command extensions in place, without reconnecting to Discord.
+
+        Usage: !reload [chat|verify|players|scheduler|admin ...]   (no names = all)
+        """
+        try:
+            # Admin only
+            if ctx.guild is None or not ctx.author.guild_permissions.administrator:
+                await ctx.send("❌ You don't have permission to use this command.")
+                return
+
+            extensions = [f"cogs.{name}" for name in names] if names else list(EXTENSIONS)
+            unknown = [ext for ext in extensions if ext not in EXTENSIONS]
+            if unknown:
+                await ctx.send(f"❌ Unknown extension(s): {', '.join(unknown)}. Available: "
+                               + ", ".join(ext.split('.')[-1] for ext in EXTENSIONS))
+                return
+
+            lines = []
+            total = 0.0
+            for extension in extensions:
+                started = time.perf_counter()
+                try:
+                    await self.bot.reload_extension(extension)
+                except commands.ExtensionNotLoaded:
+                    await self.bot.load_extension(extension)
+                except commands.ExtensionError as e:
+                    # discord.py keeps the previous version loaded if the new one fails
+                    report_exception('reload_extensions', ctx, extension=extension)
+                    lines.append(f"❌ {extension}: {e}")
+                    continue
+                elapsed = (time.perf_counter() - started) * 1000
+                total += elapsed
+                lines.append(f"✅ {extension}: {elapsed:.1f} ms")
+
+            # Worker processes keep the modules they imported, new ones load the reloaded code
+            started = time.perf_counter()
+            if await ai_workers.restart():
+                lines.append(f"✅ AI workers restarted: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+            startup = getattr(self.bot, 'startup_seconds', None)
+            summary = f"🔄 Reloaded in {total:.1f} ms total"
+            if startup:
+                summary += f" (a full restart took {startup:.1f} s to get ready)"
+            event('reload', "Extensions reloaded", ctx, extensions=extensions, reload_ms=round(total, 1))
+            await ctx.send(summary + "\n" + "\n".join(lines))
+
+        except Exception as e:
+            # Prevent propagation to on_command_error to avoid duplicate messages
+            report_exception('reload_extensions', ctx)
+
+    @commands.command(name='config')
+    async def config_command(self, ctx, action: str = None):
+        """
+        Reloads the configuration (.env) without restarting. `kill -HUP` does the same.
+
+        Usage: !config reload
+        """
+        try:
+            # Admin only
+            if ctx.guild is None or not ctx.author.guild_permissions.administrator:
+                await ctx.send("❌ You don't have permission to use this command.")
+                return
+
+            if action != 'reload':
+                await ctx.send("❌ Usage: `!config reload`")
+                return
+
+            changed = config.reload_settings()
+            log.info("Configuration reloaded, changed: %s", ", ".join(changed) or "nothing")
+            # Only names, never values (tokens and keys live here)
+            reply = f"✅ Configuration reloaded. Changed: {', '.join(changed) or 'nothing'}"
+            pending = [name for name in changed if name in config.RESTART_ONLY]
+            if pending:
+                reply += f"\n⚠️ Only applied after a restart: {', '.join(pending)}"
+            reply += (f"\n-# Always restart-only: {', '.join(name.upper() for name in config.RESTART_ONLY)}, "
+                      f"{', '.join(config.RESTART_ONLY_ENV)}")
+            await ctx.send(reply)
+
+        except Exception as e:
+            # Prevent propagation to on_command_error to avoid duplicate messages
+            report_exception('config_command', ctx)
+
+    @commands.command(name='outbox')
+    async def outbox_stats(self, ctx):
+        """
+        Shows the outbound message queues: depth per channel and latency per priority.
+
+        Usage: !outbox
+        """
+        try:
+            # Admin only
+            if ctx.guild is None or not ctx.author.guild_permissions.administrator:
+                await ctx.send("❌ You don't have permission to use this command.")
+                return
+
+            stats = self.bot.outbox.stats()
+            lines = [f"📬 **Outbox**: {stats['messages_sent']} message(s) in {stats['sends']} send(s) "
+                     f"({stats['merged']} merged), {stats['rate_limited']} rate-limited, {stats['failed']} failed, "
+                     f"max queue depth {stats['max_depth']}"]
+            for channel_id, depth in stats['queued'].items():
+                channel = self.bot.get_channel(channel_id)
+                lines.append(f"Queued in {channel.mention if channel else channel_id}: {depth}")
+            for priority, latency in stats['latency'].items():
+                lines.append(f"{priority}: p50 {latency['p50_ms']} ms, p95 {latency['p95_ms']} ms, "
+                             f"max {latency['max_ms']} ms ({latency['count']} messages)")
+            await ctx.send("\n".join(lines)[:2000])
+
+        except Exception as e:
+            # Prevent propagation to on_command_error to avoid duplicate messages
+            report_exception('outbox_stats', ctx)
+
+
+async def setup(bot):
+    await bot.add_cog(Admin(bot))
@@ -0,0 +1,570 @@
+"""
+Chatting with the bot, sending messages to channels and welcoming new members.
+"""
+import asyncio
+import logging
+import re
+import time
+
+import aiohttp
+import discord
+from discord.ext import commands
+
+import ai_workers
+import config
+from bot_logging import event, report_exception
+from conversation_memory import estimate_tokens, fallback_summary
+from outbox import NORMAL, LOW
+
+
+# Channel name index per guild, rebuilt lazily after channel changes
+_channel_indexes = {}
+
+
+def channel_index(guild):
+    """{lowercase name: [channels]} for the guild, built once and cached"""
+    index = _channel_indexes.get(guild.id)
+    if index is None:
+        index = {}
+        for channel in guild.channels:
+            index.setdefault(channel.name.lower(), []).append(channel)
+        _channel_indexes[guild.id] = index
+    return index
+
+
+def find_channel(guild, name, kind=None):
+    """Channel by name (only channels of type `kind` if given): exact match first, then case-insensitive"""
+    candidates = channel_index(guild).get(name.lower(), [])
+    if kind is not None:
+        candidates = [channel for channel in candidates if isinstance(channel, kind)]
+    for channel in candidates:
+        if channel.name == name:
+            return channel
+    return candidates[0] if candidates else None
+
+
+def resolve_broadcast_targets(guild, selector):
+    """
+    Resolves "name1,name2,..." and/or "category:<name>" into text channels.
+    Returns (channels, names that didn't match anything).
+    """
+    channels = []
+    missing = []
+    for part in (p.strip() for p in selector.split(',')):
+        if not part:
+            continue
+        if part.lower().startswith('category:'):
+            # A text channel with the same name as the category must not shadow it
+            category = find_channel(guild, part.split(':', 1)[1].strip(), kind=discord.CategoryChannel)
+            if category is not None:
+                channels.extend(c for c in category.channels if isinstance(c, discord.TextChannel))
+            else:
+                missing.append(part)
+        else:
+            channel = find_channel(guild, part.lstrip('#'))
+            if channel is None:
+                missing.append(part)
+            else:
+                channels.append(channel)
+    # Keep order, drop duplicates
+    return list(dict.fromkeys(channels)), missing
+
+
+async def broadcast_message(ctx, selector, message_text):
+    """Sends one message to every channel in the selector and replies with one aggregated status"""
+    channels, missing = resolve_broadcast_targets(ctx.guild, selector)
+
+    # Check permissions up front, nothing is sent to channels we can't post in
+    results = [(name, "❌ not found", None) for name in missing]
+    sendable = []
+    for channel in channels:
+        if not hasattr(channel, 'send'):
+            results.append((channel.mention, "❌ not a text channel", None))
+        elif not channel.permissions_for(ctx.guild.me).send_messages:
+            results.append((channel.mention, "❌ no permission", None))
+        else:
+            sendable.append(channel)
+
+    if not sendable:
+        await ctx.send("❌ None of the selected channels can receive the message.\n"
+                       + "\n".join(f"{name}: {status}" for name, status, _ in results))
+        return
+
+    # Sends go to different channels (different rate-limit buckets, each with its own
+    # outbox queue); the semaphore keeps us under the global limit
+    semaphore = asyncio.Semaphore(config.settings.broadcast_concurrency)
+
+    async def send_one(channel):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await ctx.bot.outbox.send(channel, message_text, priority=NORMAL)
+                status = "✅ sent"
+            except discord.Forbidden:
+                status = "❌ no permission"
+            except Exception as e:
+                report_exception('broadcast_message.send', ctx, channel_id=channel.id)
+                status = f"❌ {str(e)[:80]}"
+            return channel.mention, status, (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    results = list(await asyncio.gather(*(send_one(channel) for channel in sendable))) + results
+    total_ms = (time.perf_counter() - started) * 1000
+
+    sent = sum(1 for _, status, _ in results if status.startswith("✅"))
+    lines = [f"{name}: {status}" + (f" ({ms:.0f} ms)" if ms is not None else "") for name, status, ms in results]
+    summary = f"📣 Broadcast sent to {sent}/{len(results)} channel(s) in {total_ms:.0f} ms\n" + "\n".join(lines)
+    if len(summary) > 2000:
+        summary = summary[:1997] + "..."
+    await ctx.bot.outbox.send(ctx.channel, summary, priority=LOW)
+
+
+async def generate_reply(gemini_api_key, context, max_output_tokens=500):
+    """
+    Asks Gemini for the !bot reply. Returns (response text or None, last error, usageMetadata).
+    Runs in an AI worker process when AI_WORKERS is set, so it only takes picklable arguments.
+    """
+    headers = {
+        'Content-Type': 'application/json',
+    }
+
+    data = {
+        "contents": [{
+            "parts": [{"text": context}]
+        }],
+        "generationConfig": {
+            "temperature": 0.7,
+            "maxOutputTokens": max_output_tokens,
+            # Thinking tokens count against maxOutputTokens, a short reply doesn't need them
+            "thinkingConfig": {"thinkingBudget": 0},
+        }
+    }
+
+    # First, try to list available models (exact same approach as verify command)
+    available_model = None
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(
+                f"{config.settings.gemini_api_base}/v1beta/models?key={gemini_api_key}",
+                headers=headers
+            ) as resp:
+                if resp.status == 200:
+                    models_result = await resp.json()
+                    if 'models' in models_result:
+                        # Find a model that supports generateContent
+                        for model in models_result['models']:
+                            name = model.get('name', '')
+                            methods = model.get('supportedGenerationMethods', [])
+                            if 'generateContent' in methods:
+                                # Prefer vision models (or any working model)
+                                if 'vision' in name.lower() or '1.5' in name.lower() or 'flash' in name.lower():
+                                    available_model = name.split('/')[-1]
+                                    break
+                                elif not available_model:
+                                    available_model = name.split('/')[-1]
+    except Exception:
+        report_exception('chat_with_bot.list_models', level=logging.WARNING)
+
+    # Try different models and API versions (exact same as verify command)
+    models_to_try = []
+    if available_model:
+        models_to_try.append(available_model)
+
+    # Add common model names
+    models_to_try.extend([
+        "gemini-1.5-flash",
+        "gemini-1.5-pro",
+    ])
+
+    response_text = None
+    last_error = None
+    usage = {}
+
+    for model_name in models_to_try:
+        # Try both v1beta and v1
+        for api_version in ["v1beta", "v1"]:
+            try:
+                endpoint = f"{config.settings.gemini_api_base}/{api_version}/models/{model_name}:generateContent?key={gemini_api_key}"
+                async with aiohttp.ClientSession() as session:
+                    async with session.post(endpoint, headers=headers, json=data) as resp:
+                        if resp.status == 200:
+                            result = await resp.json()
+                            if 'candidates' in result and len(result['candidates']) > 0:
+                                candidate = result['candidates'][0]
+                                if 'content' in candidate:
+                                    if 'parts' in candidate['content']:
+                                        response_text = candidate['content']['parts'][0]['text']
+                                        usage = result.get('usageMetadata', {})
+                                        break
+                                # e.g. MAX_TOKENS or SAFETY without any text
+                                last_error = f"{model_name} returned no text (finishReason {candidate.get('finishReason')})"
+                            else:
+                                block_reason = result.get('promptFeedback', {}).get('blockReason')
+                                last_error = f"{model_name} returned no candidates (blockReason {block_reason})"
+                        else:
+                            error_text = await resp.text()
+                            last_error = f"Status {resp.status}: {error_text[:200]}"
+                            if 'thinking' in error_text.lower() and 'thinkingConfig' in data['generationConfig']:
+                                # Models that don't think reject thinkingConfig, send the rest without it
+                                data = dict(data, generationConfig={key: value for key, value in data['generationConfig'].items()
+                                                                    if key != 'thinkingConfig'})
+                            continue
+            except Exception as e:
+                last_error = str(e)
+                continue
+        if response_text:
+            break
+
+    return response_text, last_error, usage
+
+
+# Folds turns that no longer fit the conversation buffer into the channel's summary
+SUMMARY_PROMPT = """Summarize this Discord conversation between members and a bot in at most {words} words.
+Keep names, facts, what was already answered and questions still open. Only output the summary.
+
+Summary so far: {summary}
+
+Newer messages:
+{messages}"""
+
+
+class Chat(commands.Cog):
+    """!bot, !sendmessage and the welcome message"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        # Channels whose conversation summary is being rewritten right now
+        self.summarizing = set()
+        # Track processed events to prevent duplicates (kept in the state store across restarts and reloads)
+        self.processed_members = set(bot.state.get('processed_members', []))
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member):
+        """
+        Welcomes new members to the server.
+        """
+        try:
+            # Prevent duplicate welcome messages
+            member_key = f"{member.id}_{member.guild.id}"
+            if member_key in self.processed_members:
+                return
+            self.processed_members.add(member_key)
+
+            # Clean up old entries (keep last 1000)
+            if len(self.processed_members) > 1000:
+                self.processed_members.clear()
+            self.bot.state.set('processed_members', list(self.processed_members))
+
+            # Assign guest role to new members
+            guest_role = discord.utils.get(member.guild.roles, name="guest")
+            if not guest_role:
+                guest_role = discord.utils.get(member.guild.roles, name="Guest")
+
+            if guest_role:
+                try:
+                    if member.guild.me.guild_permissions.manage_roles:
+                        if member.guild.me.top_role > guest_role:
+                            if guest_role not in member.roles:
+                                await member.add_roles(guest_role, reason="New member - assigned guest role")
+                except Exception:
+                    report_exception('on_member_join.guest_role', level=logging.WARNING,
+                                     guild=member.guild.id, user=member.id)
+
+            # Get the target welcome channel ID
+            welcome_channel_id = 1440064713584279632
+            welcome_channel = self.bot.get_channel(welcome_channel_id)
+
+            if welcome_channel:
+                welcome_message = f"Welcome, {member.mention}!"
+                await self.bot.outbox.send(welcome_channel, welcome_message, priority=NORMAL)
+        except Exception as e:
+            # Welcome message couldn't be sent
+            report_exception('on_member_join', guild=member.guild.id, user=member.id)
+
+    async def remember(self, ctx, gemini_api_key, message, response_text, usage, history_tokens):
+        """
+        Stores the exchange in the channel's conversation memory, folds turns that fell out
+        of the buffer into the rolling summary, and logs the request's token use.
+        """
+        memory = self.bot.conversations
+        channel_id = ctx.channel.id
+        memory.add(channel_id, ctx.author.display_name, message)
+        memory.add(channel_id, "Bot", response_text)
+
+        summary_usage = {}
+        summary_calls = 0
+        # One summary rewrite per channel at a time, the overflow waits for the next reply otherwise.
+        # take_overflow only hands out turns once enough have piled up for a summary call.
+        if channel_id not in self.summarizing:
+            self.summarizing.add(channel_id)
+            try:
+                summary, turns = memory.take_overflow(channel_id)
+                if turns:
+                    prompt = SUMMARY_PROMPT.format(
+                        words=memory.summary_tokens // 2, summary=summary or "(none)",
+                        messages="\n".join(f"{speaker}: {text}" for speaker, text in turns))
+                    new_summary = None
+                    summary_calls = 1
+                    try:
+                        new_summary, _, summary_usage = await ai_workers.run(
+                            generate_reply, gemini_api_key, prompt, memory.summary_tokens)
+                    except Exception:
+                        report_exception('chat_with_bot.summary', ctx, level=logging.WARNING)
+                    memory.set_summary(channel_id, new_summary or fallback_summary(summary, turns, memory.summary_tokens))
+            finally:
+                self.summarizing.discard(channel_id)
+
+        stats = memory.stats(channel_id)
+        event('chat', "Chat reply", ctx,
+              prompt_tokens=usage.get('promptTokenCount'), output_tokens=usage.get('candidatesTokenCount'),
+              history_tokens=history_tokens,
+              summary_calls=summary_calls,
+              summary_prompt_tokens=summary_usage.get('promptTokenCount'),
+              summary_output_tokens=summary_usage.get('candidatesTokenCount'),
+              overflow_tokens=stats.get('overflow_tokens'),
+              memory_tokens=stats['total_tokens'], memory_channels=stats['channels'])
+
+    @commands.command(name='bot')
+    async def chat_with_bot(self, ctx, *, message: str):
+        """
+        Chat with the bot using Gemini AI.
+
+        Usage: !bot your message here
+        """
+        try:
+            # Check if command is used in a server (not DM)
+            if ctx.guild is None:
+                await ctx.send("❌ This command can only be used in a server, not in direct messages.")
+                return
+
+            # Check for inappropriate content (only check for actual profanity, not common words)
+            bad_words = ['fuck', 'shit', 'damn', 'asshole', 'bitch', 'crap', 'piss off', 'bastard', 'slut', 'whore', 'nigger', 'nigga', 'retard', 'fag', 'faggot', 'cunt', 'dickhead', 'motherfucker']
+            message_lower = message.lower()
+            # Only flag if it's clearly profanity (word boundaries to avoid false positives)
+            bad_word_pattern = r'\b(' + '|'.join(re.escape(word) for word in bad_words) + r')\b'
+            if re.search(bad_word_pattern, message_lower):
+                await ctx.send("Hey! Don't be mean! That's not good to say this.")
+                return
+
+            current_gemini_key = config.settings.gemini_api_key
+
+            if not current_gemini_key:
+                await ctx.send("❌ Gemini API key not configured.")
+                return
+
+            # Check for role mentions like "marshal"
+            if "marshal" in message_lower or "who is the marshal" in message_lower:
+                marshal_role = discord.utils.get(ctx.guild.roles, name="Marshal")
+                if not marshal_role:
+                    marshal_role = discord.utils.get(ctx.guild.roles, name="marshal")
+
+                if marshal_role:
+                    # Find members with marshal role
+                    members_with_role = [member.mention for member in ctx.guild.members if marshal_role in member.roles]
+                    if members_with_role:
+                        await ctx.send(f"The Marshal is: {', '.join(members_with_role)}")
+                        return
+                    else:
+                        await ctx.send("No one currently has the Marshal role.")
+                        return
+
+            # Check for other role mentions
+            for role in ctx.guild.roles:
+                if role.name.lower() in message_lower and role.name.lower() not in ['everyone', 'here']:
+                    members_with_role = [member.mention for member in ctx.guild.members if role in member.roles]
+                    if members_with_role:
+                        role_info = f"The {role.name} role is held by: {', '.join(members_with_role)}"
+                        await ctx.send(role_info)
+                        return
+
+            # What was said before in this channel: rolling summary of older turns + recent turns
+            summary, recent = self.bot.conversations.render(ctx.channel.id)
+            history = ""
+            if summary:
+                history += f"\n    Summary of the earlier conversation in this channel: {summary}\n"
+            if recent:
+                history += f"\n    Recent messages in this channel (oldest first):\n{recent}\n"
+
+            # Prepare context for Gemini
+            context = f"""You are a helpful bot in a Discord server called "The Golden Rampant" for the game "Bulwark".
+
+    Server context:
+    - Server name: The Golden Rampant
+    - Game: Bulwark (on Roblox)
+    - Server timezone: Europe (UTC+1/+2)
+    - Chat clear schedule: The chat is automatically cleared on the 1st of every month at 12:00 PM (noon) in the server timezone (Europe, UTC+1/+2). Users receive warnings 3 days, 1 day, 1 hour, and 1 minute before the clear.
+
+    About Bulwark:
+    Bulwark is a Roblox game focused on medieval melee combat: swords, axes, halberds, shields and fist-fights. It plays like a skill-based dueling game (similar in feel to Chivalry / Mordhau), where spacing, timing and reading your opponent decide the outcome – not overpowered perks or magic spells.
+
+    Map – island of Bulwark:
+    - Town and market
+    - Main dueling ground / arena
+    - Church / temple area
+    - Volcano with cave systems
+    - Farms and bee farm
+    - Coastline and small outer islets
+    - Hidden tunnels and secret rooms
+
+    NPCs: Guards, tavern NPCs, lords, the blacksmith, mysterious characters. Provide lore, atmosphere, and sometimes indirect hints about locations and secrets.
+
+    Core gameplay: 1v1 duels, Free-for-all (FFA) fights, exploration of the island to find lore, weapons, armor and hidden skins. Emphasis on fair, skill-driven melee combat.
+
+    Weapon System:
+    Weapons have distinct damage, range, windup/release/recovery timings, stamina consumption, and sometimes special behaviors.
+
+    Common weapon categories:
+    - Longsword: Balanced range and speed, great for beginners
+    - Halberd: Long reach, slower swings, good for controlling distance and punishing whiffs
+    - Billhook: Medium/long reach with a hooked blade, unusual swing arcs
+    - Stiletto / Daggers: Short range, very fast, for aggressive players
+    - Axes (Executioner's Axe, Hatchet, etc.): High damage, slower and heavier, reward prediction
+    - Fists: No weapon; mainly for fun and flex, can still be dangerous with perfect spacing
+
+    Most weapons have base versions (bought from blacksmith shop for Sheldons) and special skins (secret or cosmetic variants, typically share same stats, obtained through exploration).
+
+    Secret Weapon Skins:
+
+    Orphic Sickle (Sickle Skin):
+    - Cosmetic skin for the Sickle
+    - Location: Hidden room behind a bush near the town gate by the shop
+    - How to get it: Go to town/shop area, find the gate area with a normal-looking bush, walk directly into the bush to phase into a hidden cave room. Inside you'll see a table, lantern, barrel, and a sickle lying on the table. Interact with the sickle to unlock Orphic Sickle skin.
+    - Orphic Sickle does not significantly change stats – it is a cosmetic flex
+
+    Ancient Hatchet (Hatchet Skin):
+    - Cosmetic skin for the Hatchet
+    - Location: Sinachucu Caverns under the volcano
+    - How to get it: Travel to the far side of the island, near or under the volcano. Find the entrance to Sinachucu Caverns – humid caves under the volcano. Inside, look for a small steaming pool and multiple branching corridors. In one of those side tunnels you'll find a skeleton with an arm chopped off by a hatchet, the hatchet stuck in the bones. Interact with this hatchet to unlock Ancient Hatchet skin.
+    - Ancient Hatchet is again a cosmetic reskin
+
+    Other Secrets and Potential Future Weapon Spots:
+    - Mysterious Buttons: Small circular protrusions that appeared on the map, purpose remains uncertain
+    - Warkade Machine: Hidden arcade machine deep in the volcano caves, currently more of a novelty/flex
+    - Hidden Stone Door: Giant stone door near the bee farm, emitting white particles, seems to lead into large underground space but entrance is blocked by rock
+    - Hidden Tunnels: Some houses in town area have tunnels underneath them, lead to lower cave areas
+    - Rusty Car: Rusted car frame on an island near the church, completely out of place in medieval world
+
+    Weapon Skins and Gameplay:
+    - Base weapons: Bought from shop, define playstyle (range, speed, stamina use). Used to learn spacing, parries, blocks, feints, timing, stamina management
+    - Secret skins: Typically cosmetic reskins, do not fundamentally change balance or give unfair advantages. Function as proof of exploration, style/flex, collectibles tied to specific lore and locations
+    - You do not need secret skins to be powerful in combat, but having them makes you stand out and signals you know the game's world and secrets
+
+    Two rival empires compete: Guesmand and Sunderland. Players compete in tournaments.
+
+    Important rules:
+    - Do NOT generate images
+    - Do NOT say odd or inappropriate things
+    - Be helpful and friendly
+    - Keep responses concise and relevant
+    - If asked about roles, mention that you can check who has specific roles
+    - If someone greets you (says hello, hi, etc.), respond with "Welcome to The Golden Rampant! How can I help?"
+    - If asked what AI model you are or what model you use, say you're just a helpful bot and don't reveal technical details
+    - Never mention Gemini, Google, AI models, or technical implementation details
+    - When discussing Bulwark, you can provide information about weapons, secrets, locations, and gameplay mechanics based on the knowledge provided
+    - Do not mention in greetings that you know about Bulwark details – keep greeting simple and friendly
+
+{history}
+    User's message: {message}
+
+    Respond naturally and helpfully, but keep it short and appropriate."""
+
+            # Use Gemini API to generate response (in an AI worker process if enabled)
+            try:
+                response_text, last_error, usage = await ai_workers.run(generate_reply, current_gemini_key, context)
+
+                if response_text:
+                    # Check response for inappropriate content (with word boundaries)
+                    response_lower = response_text.lower()
+                    bad_word_pattern = r'\b(' + '|'.join(re.escape(word) for word in bad_words) + r')\b'
+                    if re.search(bad_word_pattern, response_lower):
+                        await ctx.send("Hey! Don't be mean! That's not good to say this.")
+                        return
+
+                    # Send response (limit to 2000 characters for Discord)
+                    if len(response_text) > 2000:
+                        response_text = response_text[:1997] + "..."
+                    await self.bot.outbox.send(ctx.channel, response_text, priority=NORMAL)
+                    await self.remember(ctx, current_gemini_key, message, response_text, usage, estimate_tokens(history))
+                    return  # Explicit return to prevent any duplicate sending
+                else:
+                    error_msg = "Sorry, I couldn't generate a response right now."
+                    if last_error:
+                        error_msg += f" Error: {last_error}"
+                    await ctx.send(error_msg)
+                    return  # Explicit return to prevent any duplicate sending
+
+            except Exception as e:
+                report_exception('chat_with_bot.generate', ctx)
+                await ctx.send(f"Error: {str(e)}")
+                return  # Explicit return to prevent any duplicate sending
+
+        except Exception as e:
+            # Prevent propagation to on_command_error to avoid duplicate messages
+            report_exception('chat_with_bot', ctx)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_create(self, channel):
+        _channel_indexes.pop(channel.guild.id, None)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel):
+        _channel_indexes.pop(channel.guild.id, None)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_update(self, before, after):
+        if before.name != after.name or before.category_id != after.category_id:
+            _channel_indexes.pop(after.guild.id, None)
+
+    @commands.command(name='sendmessage')
+    async def send_message(self, ctx, channel_name: str, *, message_text: str):
+        """
+        Sends a message to a specified channel, or to several channels at once.
+
+        Usage: !sendmessage channel_name message_text
+               !sendmessage channel1,channel2,... message_text
+               !sendmessage category:CategoryName message_text
+               !sendmessage "category:Category Name,channel" message_text
+
+        A selector with spaces in it must be quoted as a whole.
+
+        Example: !sendmessage general Hello everyone!
+        """
+        try:
+            # Check if command is used in a server (not DM)
+            if ctx.guild is None:
+                await ctx.send("❌ This command can only be used in a server, not in direct messages.")
+                return
+
+            if ',' in channel_name or channel_name.lower().startswith('category:'):
+                await broadcast_message(ctx, channel_name, message_text)
+                return
+
+            # Find the channel by name
+            channel = find_channel(ctx.guild, channel_name)
+
+            if channel is None:
+                await ctx.send(f"❌ Channel '{channel_name}' not found. Please check the channel name and try again.")
+                return
+
+            # Check if bot has permission to send messages in that channel
+            if not channel.permissions_for(ctx.guild.me).send_messages:
+                await ctx.send(f"❌ I don't have permission to send messages in {channel.mention}")
+                return
+
+            # Send the message to the specified channel
+            try:
+                await self.bot.outbox.send(channel, message_text, priority=NORMAL)
+                await self.bot.outbox.send(ctx.channel, f"✅ Message sent to {channel.mention}!", priority=LOW)
+            except discord.Forbidden:
+                await ctx.send(f"❌ I don't have permission to send messages in that channel.")
+            except Exception as e:
+                report_exception('send_message.send', ctx)
+                await ctx.send(f"❌ An error occurred: {str(e)}")
+
+        except Exception as e:
+            # Prevent propagation to on_command_error to avoid duplicate messages
+            report_exception('send_message', ctx)
+
+
+async def setup(bot):
+    await bot.add_cog(Chat(bot))
@@ -0,0 +1,122 @@
+"""
+Lookups in the verified player registry: !player and !leaderboard.
+"""
+import asyncio
+import time
+from datetime import datetime
+from typing import Optional, Union
+
+import discord
+from discord.ext import commands
+
+from bot_logging import report_exception
+from config import POLAND_TZ
+from player_registry import LEADERBOARD_FIELDS
+
+# Players per leaderboard page
+PAGE_SIZE = 10
+
+
+class Players(commands.Cog):
+    """!player and !leaderboard"""
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    def describe(self, guild, player, rating_rank):
+        member = guild.get_member(player['discord_id'])
+        verified_at = datetime.fromtimestamp(player['verified_at'], POLAND_TZ).strftime('%B %d, %Y')
+        return (f"**{player['roblox_username']}** — {member.mention if member else player['discord_id']}\n"
+                f"Level: {player['level'] if player['level'] is not None else 'N/A'} | "
+                f"Rating: {player['rating'] if player['rating'] is not None else 'N/A'}"
+                + (f" (#{rating_rank})" if rating_rank else "")
+                + f" | Verified: {verified_at}")
+
+    @commands.command(name='player')
+    async def player_info(self, ctx, *, who: Union[discord.Member, str]):
+        """
+        Shows a verified player by Discord member or Roblox username.
+
+        Usage: !player @member
+               !player RobloxUsername
+        """
+        try:
+            # Check if command is used in a server (not DM)
+            if ctx.guild is None:
+                await ctx.send("❌ This command can only be used in a server, not in direct messages.")
+                return
+
+            started = time.perf_counter()
+            registry = self.bot.players
+            if isinstance(who, discord.Member):
+                player = await asyncio.to_thread(registry.by_discord_id, who.id)
+                players = [player] if player else []
+            else:
+                players = await asyncio.to_thread(registry.by_username, who.strip())
+            players = [p for p in players if p['guild_id'] == ctx.guild.id]
+
+            if not players:
+                await ctx.send(f"❌ No verified player found for {who.mention if isinstance(who, discord.Member) else f'`{who}`'}.")
+                return
+
+            lines = []
+            for player in players[:5]:
+                rating_rank = await asyncio.to_thread(registry.rank, ctx.guild.id, 'rating', player['rating'])
+                lines.append(self.describe(ctx.guild, player, rating_rank))
+            elapsed = (time.perf_counter() - started) * 1000
+            await ctx.send("\n\n".join(lines) + f"\n-# {elapsed:.1f} ms",
+                           allowed_mentions=discord.AllowedMentions.none())
+
+        except Exception as e:
+            # Prevent propagation to on_command_error to avoid duplicate messages
+            report_exception('player_info', ctx)
+
+    @commands.command(name='leaderboard', aliases=['top'])
+    async def leaderboard(self, ctx, field: Optional[str] = 'rating', page: int = 1):
+        """
+        Shows the verified players sorted by rating or level.
+
+        Usage: !leaderboard [rating|level] [page]
+
+        Example: !leaderboard level 2
+        """
+        try:
+            # Check if command is used in a server (not DM)
+            if ctx.guild is None:
+                await ctx.send("❌ This command can only be used in a server, not in direct messages.")
+                return
+
+            # "!leaderboard 2" means page 2 of the rating leaderboard
+            if field and field.isdigit():
+                field, page = 'rating', int(field)
+            field = (field or 'rating').lower()
+            if field not in LEADERBOARD_FIELDS:
+                await ctx.send(f"❌ Unknown leaderboard. Use one of: {', '.join(LEADERBOARD_FIELDS)}")
+                return
+            page = max(page, 1)
+
+            started = time.perf_counter()
+            rows, total = await asyncio.to_thread(self.bot.players.leaderboard, ctx.guild.id, field, page, PAGE_SIZE)
+            elapsed = (time.perf_counter() - started) * 1000
+
+            pages = max((total + PAGE_SIZE - 1) // PAGE_SIZE, 1)
+            if not rows:
+                await ctx.send(f"❌ Page {page} is empty, the {field} leaderboard has {pages} page(s).")
+                return
+
+            lines = []
+            for position, player in enumerate(rows, start=(page - 1) * PAGE_SIZE + 1):
+                member = ctx.guild.get_member(player['discord_id'])
+                lines.append(f"**{position}.** {player['roblox_username']} "
+                             f"({member.mention if member else player['discord_id']}) — {field.capitalize()}: {player[field]}")
+            await ctx.send(f"🏆 **Top {field}** — page {page}/{pages} ({total} players)\n"
+                           + "\n".join(lines) + f"\n-# {elapsed:.1f} ms",
+                           allowed_mentions=discord.AllowedMentions.none())
+
+        except Exception as e:
+            # Prevent propagation to on_command_error to avoid duplicate messages
+            report_exception('leaderboard', ctx)
+
+
+async def setup(bot):
+    await bot.add_cog(Players(bot))
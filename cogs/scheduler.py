@@ -0,0 +1,416 @@
+"""
+Scheduled chat clear and New Year countdown, plus the commands that control them.
+"""
+import logging
+from datetime import datetime, timedelta
+
+import discord
+from discord.ext import commands, tasks
+
+import archive
+from bot_logging import log, report_exception
+import config
+from config import POLAND_TZ, TARGET_CHANNEL_ID
+from outbox import URGENT, NORMAL, LOW
+
+
+def current_clear_cycle(now):
+    """
+    The clear (ISO datetime) the scheduler flags currently belong to: this month's
+    until its 5-minute clear window has passed, next month's after that.
+    """
+    this_month = datetime(now.year, now.month, 1, 12, 0, 0, tzinfo=POLAND_TZ)
+    if now < this_month + timedelta(minutes=5):
+        return this_month.isoformat()
+    if now.month == 12:
+        return datetime(now.year + 1, 1, 1, 12, 0, 0, tzinfo=POLAND_TZ).isoformat()
+    return datetime(now.year, now.month + 1, 1, 12, 0, 0, tzinfo=POLAND_TZ).isoformat()
+
+
+class Scheduler(commands.Cog):
+    """Chat clear scheduling and New Year countdown"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        # State lives in the state store so it survives restarts and reloads of this cog
+        state = bot.state
+        self.chat_clear_enabled = state.get('chat_clear_enabled', True)  # Set to False when !notclear is used
+        self.warnings_sent = state.get('warnings_sent', {'3days': False, '1day': False, '1hour': False, '1minute': False})  # Track sent warnings
+        self.clear_cycle = state.get('clear_cycle')  # The clear (ISO datetime) the flags above belong to
+        self.clear_done = state.get('clear_done', False)  # Whether that clear already happened
+        self.clear_in_progress = state.get('clear_in_progress', False)  # Started but not finished (crash, redeploy)
+        self.new_year_1min_sent = state.get('new_year_1min_sent', False)  # Track if 1-minute warning was sent
+        self.new_year_countdown_sent = set(state.get('new_year_countdown_sent', []))  # Track which countdown seconds were sent
+
+    async def cog_load(self):
+        # Start the scheduled tasks
+        self.check_chat_clear.start()
+        self.check_new_year.start()
+
+    async def cog_unload(self):
+        self.check_chat_clear.cancel()
+        self.check_new_year.cancel()
+
+    def save_scheduler_state(self):
+        """Queue the chat clear scheduler state for the state store"""
+        self.bot.state.set('chat_clear_enabled', self.chat_clear_enabled)
+        self.bot.state.set('warnings_sent', self.warnings_sent)
+        self.bot.state.set('clear_cycle', self.clear_cycle)
+        self.bot.state.set('clear_done', self.clear_done)
+        self.bot.state.set('clear_in_progress', self.clear_in_progress)
+
+    @tasks.loop(minutes=1)  # Check every minute for accurate 1-minute warnings
+    async def check_chat_clear(self):
+        """Check if chat clear warnings or actual clear needs to happen"""
+        try:
+            now = datetime.now(POLAND_TZ)
+
+            # Calculate next 1st of month at 12:00 PM (noon)
+            if now.month == 12:
+                next_month = datetime(now.year + 1, 1, 1, 12, 0, 0, tzinfo=POLAND_TZ)
+            else:
+                next_month = datetime(now.year, now.month + 1, 1, 12, 0, 0, tzinfo=POLAND_TZ)
+
+            days_until = (next_month - now).days
+            hours_until = (next_month - now).total_seconds() / 3600
+
+            # New month cycle (also after downtime): clear is active again and warnings start over
+            cycle = current_clear_cycle(now)
+            if cycle != self.clear_cycle:
+                self.clear_cycle = cycle
+                self.chat_clear_enabled = True
+                self.clear_done = False
+                self.clear_in_progress = False
+                self.warnings_sent = {'3days': False, '1day': False, '1hour': False, '1minute': False}
+                self.save_scheduler_state()
+
+            # Get the target channel for warnings and clearing
+            target_channel = self.bot.get_channel(TARGET_CHANNEL_ID)
+
+            if not target_channel:
+                return  # Can't proceed without channel
+
+            # Check if it's time to clear (1st of month, 12:00 PM / noon)
+            if now.day == 1 and now.hour == 12 and now.minute < 5:  # Check within first 5 minutes
+                if self.chat_clear_enabled and not self.clear_done:
+                    # Marked done only once it has run, so a restart inside the window
+                    # retries the clear (and resumes the archive checkpoint)
+                    if self.clear_in_progress:
+                        log.warning("Chat clear for %s was interrupted, retrying", self.clear_cycle)
+                    self.clear_in_progress = True
+                    self.save_scheduler_state()
+                    try:
+                        # Delete all messages (archiving them first if enabled)
+                        deleted_count = None
+                        if config.settings.archive_before_clear:
+                            try:
+                                _, deleted_count = await archive.archive_and_purge(target_channel, config.settings.archive_dir)
+                            except discord.Forbidden:
+                                raise
+                            except Exception:
+                                # Don't skip the clear: clear without the archive and tell the admins
+                                report_exception('check_chat_clear.archive', cycle=self.clear_cycle)
+                                await self.bot.outbox.send(target_channel, "⚠️ Archiving the chat failed, clearing it without an archive.", priority=URGENT)
+                        if deleted_count is None:
+                            deleted_count = len(await target_channel.purge(limit=None, check=lambda m: not m.pinned))
+                        self.clear_done = True
+                        self.clear_in_progress = False
+                        self.save_scheduler_state()
+                        await self.bot.outbox.send(target_channel, f"Chat cleared! Deleted {deleted_count} messages.", priority=NORMAL)
+                    except discord.Forbidden:
+                        # Retrying won't help without the permission
+                        report_exception('check_chat_clear.purge', level=logging.WARNING, cycle=self.clear_cycle)
+                        self.clear_done = True
+                        self.clear_in_progress = False
+                        self.save_scheduler_state()
+                    except Exception:
+                        # Not marked done, the next check inside the window tries again
+                        report_exception('check_chat_clear.purge', cycle=self.clear_cycle)
+
+            # Check for warning dates (only if clear is enabled)
+            elif self.chat_clear_enabled:
+                # 3 days before (approximately 72 hours)
+                if 2.5 <= days_until <= 3.5 and not self.warnings_sent['3days']:
+                    try:
+                        await self.bot.outbox.send(target_channel, f"⚠️ Chat clear scheduled: 3 days remaining. Channel will be cleared on {next_month.strftime('%B 1st, %Y at %I:%M %p')}.", priority=URGENT)
+                        self.warnings_sent['3days'] = True
+                        self.save_scheduler_state()
+                    except Exception:
+                        report_exception('check_chat_clear.warning', warning='3days')
+
+                # 1 day before (approximately 24 hours)
+                elif 0.5 <= days_until <= 1.5 and not self.warnings_sent['1day']:
+                    try:
+                        await self.bot.outbox.send(target_channel, f"⚠️ Chat clear scheduled: 1 day remaining. Channel will be cleared on {next_month.strftime('%B 1st, %Y at %I:%M %p')}.", priority=URGENT)
+                        self.warnings_sent['1day'] = True
+                        self.save_scheduler_state()
+                    except Exception:
+                        report_exception('check_chat_clear.warning', warning='1day')
+
+                # 1 hour before (approximately 60 minutes)
+                elif 58 <= hours_until <= 62 and not self.warnings_sent['1hour']:
+                    try:
+                        await self.bot.outbox.send(target_channel, f"⚠️ Chat clear scheduled: 1 hour remaining. Channel will be cleared on {next_month.strftime('%B 1st, %Y at %I:%M %p')}.", priority=URGENT)
+                        self.warnings_sent['1hour'] = True
+                        self.save_scheduler_state()
+                    except Exception:
+                        report_exception('check_chat_clear.warning', warning='1hour')
+
+                # 1 minute before (approximately 60 seconds)
+                elif 0.8 <= hours_until <= 1.2 and not self.warnings_sent['1minute']:
+                    minutes_until = hours_until * 60
+                    if 58 <= minutes_until <= 62:
+                        try:
+                            await self.bot.outbox.send(target_channel, f"⚠️ Chat clear scheduled: 1 minute remaining. Channel will be cleared on {next_month.strftime('%B 1st, %Y at %I:%M %p')}.", priority=URGENT)
+                            self.warnings_sent['1minute'] = True
+                            self.save_scheduler_state()
+                        except Exception:
+                            report_exception('check_chat_clear.warning', warning='1minute')
+
+        except Exception as e:
+            report_exception('check_chat_clear')
+
+    @tasks.loop(seconds=1)  # Check every second for accurate countdown
+    async def check_new_year(self):
+        """Check for New Year countdown and send messages"""
+        try:
+            now = datetime.now(POLAND_TZ)
+
+            # Get the target channel
+            target_channel = self.bot.get_channel(TARGET_CHANNEL_ID)
+
+            if not target_channel:
+                return  # Can't proceed without channel
+
+            # Check if it's December 31st
+            if now.month == 12 and now.day == 31:
+                # Calculate time until midnight (January 1st, 00:00:00)
+                next_year = datetime(now.year + 1, 1, 1, 0, 0, 0, tzinfo=POLAND_TZ)
+                time_until = (next_year - now).total_seconds()
+
+                # 1 minute before (60 seconds)
+                if 59 <= time_until <= 61 and not self.new_year_1min_sent:
+                    try:
+                        await self.bot.outbox.send(target_channel, "The New Year starts in 1 minute!", priority=URGENT)
+                        self.new_year_1min_sent = True
+                        self.bot.state.set('new_year_1min_sent', True)
+                    except Exception:
+                        report_exception('check_new_year.1min')
+
+                # Countdown from 10 seconds (send when we're at that second mark)
+                elif 0 <= time_until <= 10:
+                    countdown_second = int(time_until)
+                    # Send when we're at the exact second (e.g., between 10.0-10.99 for "10...")
+                    if countdown_second <= 10 and countdown_second not in self.new_year_countdown_sent:
+                        try:
+                            if countdown_second == 0:
+                                await self.bot.outbox.send(target_channel, "0! Happy new year, Golden Rampant! Let this be a great year!", priority=URGENT)
+                            else:
+                                await self.bot.outbox.send(target_channel, f"{countdown_second}...", priority=URGENT)
+                            self.new_year_countdown_sent.add(countdown_second)
+                            self.bot.state.set('new_year_countdown_sent', sorted(self.new_year_countdown_sent))
+                        except Exception:
+                            report_exception('check_new_year.countdown', second=countdown_second)
+
+                # Reset flags after New Year (January 1st, after 00:00:10)
+                if now.month == 1 and now.day == 1 and now.hour == 0 and now.minute == 0 and now.second > 10:
+                    self.new_year_1min_sent = False
+                    self.new_year_countdown_sent.clear()
+            else:
+                # Reset flags if not December 31st
+                if (now.month != 12 or now.day != 31) and (self.new_year_1min_sent or self.new_year_countdown_sent):
+                    self.new_year_1min_sent = False
+                    self.new_year_countdown_sent.clear()
+                    self.bot.state.set('new_year_1min_sent', False)
+                    self.bot.state.set('new_year_countdown_sent', [])
+
+        except Exception as e:
+            report_exception('check_new_year')
+
+    @check_chat_clear.before_loop
+    @check_new_year.before_loop
+    async def wait_until_ready(self):
+        await self.bot.wait_until_ready()
+
+    @commands.command(name='notclear')
+    async def cancel_chat_clear(self, ctx):
+        """
+        Cancels the next scheduled chat clear.
+
+        Usage: !notclear
+        """
+        try:
+            # Check if command is used in a server (not DM)
+            if ctx.guild is None:
+                await ctx.send("❌ This command can only be used in a server, not in direct messages.")
+                return
+
+            # Check if user has admin/manage server permissions
+            if not ctx.author.guild_permissions.manage_guild and not ctx.author.guild_permissions.administrator:
+                await ctx.send("❌ You don't have permission to use this command.")
+                return
+
+            self.chat_clear_enabled = False
+            self.warnings_sent = {'3days': True, '1day': True, '1hour': True, '1minute': True}  # Mark as sent to prevent sending more
+            self.clear_cycle = current_clear_cycle(datetime.now(POLAND_TZ))
+            self.save_scheduler_state()
+
+            # Calculate next 1st of month for confirmation
+            now = datetime.now(POLAND_TZ)
+            if now.month == 12:
+                next_month = datetime(now.year + 1, 1, 1, 12, 0, 0, tzinfo=POLAND_TZ)
+            else:
+                next_month = datetime(now.year, now.month + 1, 1, 12, 0, 0, tzinfo=POLAND_TZ)
+
+            await self.bot.outbox.send(ctx.channel, f"✅ Chat clear cancelled. The scheduled clear on {next_month.strftime('%B 1st, %Y at %I:%M %p')} has been cancelled.", priority=LOW)
+
+        except Exception as e:
+            # Prevent propagation to on_command_error to avoid duplicate messages
+            report_exception('cancel_chat_clear', ctx)
+
+    @commands.command(name='yesclear')
+    async def enable_chat_clear(self, ctx):
+        """
+        Re-enables the chat clear if it was cancelled with !notclear.
+
+        Usage: !yesclear
+        """
+        try:
+            # Check if command is used in a server (not DM)
+            if ctx.guild is None:
+                await ctx.send("❌ This command can only be used in a server, not in direct messages.")
+                return
+
+            # Check if user has admin/manage server permissions
+            if not ctx.author.guild_permissions.manage_guild and not ctx.author.guild_permissions.administrator:
+                await ctx.send("❌ You don't have permission to use this command.")
+                return
+
+            self.chat_clear_enabled = True
+            self.warnings_sent = {'3days': False, '1day': False, '1hour': False, '1minute': False}  # Reset warnings
+            self.clear_cycle = current_clear_cycle(datetime.now(POLAND_TZ))
+            self.save_scheduler_state()
+
+            # Calculate next 1st of month for confirmation
+            now = datetime.now(POLAND_TZ)
+            if now.month == 12:
+                next_month = datetime(now.year + 1, 1, 1, 12, 0, 0, tzinfo=POLAND_TZ)
+            else:
+                next_month = datetime(now.year, now.month + 1, 1, 12, 0, 0, tzinfo=POLAND_TZ)
+
+            await self.bot.outbox.send(ctx.channel, f"✅ Chat clear **RE-ENABLED**. The scheduled clear on {next_month.strftime('%B 1st, %Y at %I:%M %p')} is now active.", priority=LOW)
+
+        except Exception as e:
+            # Prevent propagation to on_command_error to avoid duplicate messages
+            report_exception('enable_chat_clear', ctx)
+
+    @commands.command(name='clear')
+    async def clear_chat(self, ctx, mode: str = None):
+        """
+        Manually clears the chat channel.
+
+        Usage: !clear [archive|noarchive]
+        """
+        try:
+            # Check if command is used in a server (not DM)
+            if ctx.guild is None:
+                await ctx.send("❌ This command can only be used in a server, not in direct messages.")
+                return
+
+            # Check if user has admin/manage server or manage messages permission
+            if not (ctx.author.guild_permissions.manage_guild or
+                    ctx.author.guild_permissions.administrator or
+                    ctx.author.guild_permissions.manage_messages):
+                await ctx.send("❌ You don't have permission to use this command.")
+                return
+
+            # Get the target channel ID
+            clear_channel_id = 1440064713584279632
+            clear_channel = self.bot.get_channel(clear_channel_id)
+
+            if not clear_channel:
+                await ctx.send("❌ Could not find the target channel.")
+                return
+
+            # Check if bot has permission to manage messages
+            if not clear_channel.permissions_for(ctx.guild.me).manage_messages:
+                await ctx.send("❌ I don't have permission to clear messages in that channel.")
+                return
+
+            # Clear the channel (delete all messages, keeping pinned messages)
+            try:
+                if mode == 'archive' or (config.settings.archive_before_clear and mode != 'noarchive'):
+                    await self.bot.outbox.send(ctx.channel, "🗄️ Archiving the channel before clearing...", priority=LOW)
+                    try:
+                        archive_path, deleted_count = await archive.archive_and_purge(clear_channel, config.settings.archive_dir)
+                    except discord.Forbidden:
+                        raise
+                    except Exception as e:
+                        # Someone is here to decide, so nothing is cleared without the archive
+                        report_exception('clear_chat.archive', ctx)
+                        await ctx.send(f"❌ Archiving failed ({e}), the chat was not cleared. Use `!clear noarchive` to clear it without an archive.")
+                        return
+                    await self.bot.outbox.send(ctx.channel, f"✅ Chat cleared! Deleted {deleted_count} messages. Archive saved to `{archive_path}`.", priority=LOW)
+                else:
+                    deleted = await clear_channel.purge(limit=None, check=lambda m: not m.pinned)
+                    await self.bot.outbox.send(ctx.channel, f"✅ Chat cleared! Deleted {len(deleted)} messages.", priority=LOW)
+            except discord.Forbidden:
+                await ctx.send("❌ I don't have permission to delete messages in that channel.")
+            except Exception as e:
+                report_exception('clear_chat.purge', ctx)
+                await ctx.send(f"❌ Error clearing chat: {str(e)}")
+
+        except Exception as e:
+            # Prevent propagation to on_command_error to avoid duplicate messages
+            report_exception('clear_chat', ctx)
+
+    @commands.command(name='nextclear')
+    async def next_clear_info(self, ctx):
+        """
+        Shows when the next chat clear is scheduled.
+
+        Usage: !nextclear
+        """
+        try:
+            # Check if command is used in a server (not DM)
+            if ctx.guild is None:
+                await ctx.send("❌ This command can only be used in a server, not in direct messages.")
+                return
+
+            now = datetime.now(POLAND_TZ)
+
+            # Calculate next 1st of month (this month) at 12:00 PM (noon)
+            if now.month == 12:
+                next_month = datetime(now.year + 1, 1, 1, 12, 0, 0, tzinfo=POLAND_TZ)
+            else:
+                next_month = datetime(now.year, now.month + 1, 1, 12, 0, 0, tzinfo=POLAND_TZ)
+
+            # Calculate the month after that (in case current is cancelled)
+            if next_month.month == 12:
+                month_after = datetime(next_month.year + 1, 1, 1, 12, 0, 0, tzinfo=POLAND_TZ)
+            else:
+                month_after = datetime(next_month.year, next_month.month + 1, 1, 12, 0, 0, tzinfo=POLAND_TZ)
+
+            if self.chat_clear_enabled:
+                # Clear is enabled, show next clear
+                days_until = (next_month - now).days
+                hours_until = (next_month - now).total_seconds() / 3600
+                await self.bot.outbox.send(ctx.channel, f"📅 Next chat clear: **{next_month.strftime('%B 1st, %Y at %I:%M %p')}**\n"
+                                           f"⏰ Time remaining: {days_until} day(s) ({int(hours_until)} hours)", priority=LOW)
+            else:
+                # Clear is cancelled, show cancelled month and next active one
+                days_until_next = (next_month - now).days
+                days_until_after = (month_after - now).days
+                hours_until_after = (month_after - now).total_seconds() / 3600
+
+                await self.bot.outbox.send(ctx.channel, f"❌ Chat clear is **CANCELLED** for {next_month.strftime('%B 1st, %Y at %I:%M %p')}.\n\n"
+                                           f"📅 Next active chat clear: **{month_after.strftime('%B 1st, %Y at %I:%M %p')}**\n"
+                                           f"⏰ Time remaining: {days_until_after} day(s) ({int(hours_until_after)} hours)", priority=LOW)
+
+        except Exception as e:
+            # Prevent propagation to on_command_error to avoid duplicate messages
+            report_exception('next_clear_info', ctx)
+
+
+async def setup(bot):
+    await bot.add_cog(Scheduler(bot))
@@ -0,0 +1,617 @@
+"""
+Screenshot verification: !verify and the bulk !verifybacklog.
+"""
+import asyncio
+import io
+import json
+import logging
+import time
+from typing import Optional
+
+import aiohttp
+import discord
+from discord.ext import commands
+
+import ai_workers
+import config
+from bot_logging import event, report_exception
+from outbox import NORMAL, LOW
+from player_registry import parse_number
+
+
+# Verification pipeline (shared by !verify and !verifybacklog)
+VERIFY_CHANNEL_ID = 1440062982901207164
+VERIFY_PROMPT = ("Analyze this Roblox screenshot and extract: username (the Roblox name above/near the character), "
+                 "level (number after 'Level:') and rating (number after 'Rating:'). Use null for anything you can't "
+                 "read. Only if you are unsure of a value, add confidence (0 to 1).")
+VERIFY_FIELDS = ('username', 'level', 'rating')
+# Gemini response schema (OpenAPI subset), the model answers with exactly this JSON object.
+# confidence is optional so a sure answer doesn't spend tokens on it.
+VERIFY_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "username": {"type": "STRING", "nullable": True},
+        "level": {"type": "INTEGER", "nullable": True},
+        "rating": {"type": "INTEGER", "nullable": True},
+        "confidence": {"type": "NUMBER"},
+    },
+    "required": ["username", "level", "rating"],
+}
+# The JSON answer is ~25 tokens, the cap stops a rambling model early. Thinking is turned
+# off (thinkingConfig), thinking models would otherwise spend the cap before answering.
+VERIFY_MAX_OUTPUT_TOKENS = 64
+# Answers less confident than this get every field asked again
+MIN_CONFIDENCE = 0.5
+
+
+def find_role(guild, name):
+    """Find a role by name, trying the exact name, the capitalized name, then case-insensitive"""
+    role = discord.utils.get(guild.roles, name=name)
+    if not role:
+        role = discord.utils.get(guild.roles, name=name.capitalize())
+    if not role:
+        for candidate in guild.roles:
+            if candidate.name.lower() == name:
+                role = candidate
+                break
+    return role
+
+
+def get_gemini_key():
+    """Current Gemini API key from the settings snapshot (`!config reload` picks up a new one)"""
+    return config.settings.gemini_api_key
+
+
+async def find_gemini_models(session, gemini_api_key, fallbacks=("gemini-1.5-flash", "gemini-1.5-pro", "gemini-pro")):
+    """
+    Lists the available models and returns the names to try, best first.
+    Falls back to hardcoded model names if listing fails.
+    """
+    headers = {'Content-Type': 'application/json'}
+    available_model = None
+    try:
+        async with session.get(
+            f"{config.settings.gemini_api_base}/v1beta/models?key={gemini_api_key}",
+            headers=headers
+        ) as resp:
+            if resp.status == 200:
+                models_result = await resp.json()
+                if 'models' in models_result:
+                    # Find a model that supports generateContent
+                    for model in models_result['models']:
+                        name = model.get('name', '')
+                        methods = model.get('supportedGenerationMethods', [])
+                        if 'generateContent' in methods:
+                            # Prefer vision models
+                            if 'vision' in name.lower() or '1.5' in name.lower() or 'flash' in name.lower():
+                                available_model = name.split('/')[-1]
+                                break
+                            elif not available_model:
+                                available_model = name.split('/')[-1]
+    except Exception:
+        # If listing fails, we'll try hardcoded models
+        report_exception('find_gemini_models', level=logging.WARNING)
+
+    models_to_try = []
+    if available_model:
+        models_to_try.append(available_model)
+    models_to_try.extend(fallbacks)
+    return models_to_try
+
+
+async def generate_content(session, gemini_api_key, models_to_try, data):
+    """
+    Posts a generateContent request to the first model/API version that accepts it.
+    Returns (answer text, usageMetadata). Raises an Exception describing the last error if no model answered.
+    """
+    headers = {'Content-Type': 'application/json'}
+    last_error = None
+
+    for model_name in models_to_try:
+        # Try both v1beta and v1
+        for api_version in ["v1beta", "v1"]:
+            try:
+                endpoint = f"{config.settings.gemini_api_base}/{api_version}/models/{model_name}:generateContent?key={gemini_api_key}"
+                async with session.post(endpoint, headers=headers, json=data) as resp:
+                    if resp.status == 200:
+                        result = await resp.json()
+                        if 'candidates' in result and len(result['candidates']) > 0:
+                            candidate = result['candidates'][0]
+                            if 'content' in candidate:
+                                if 'parts' in candidate['content']:
+                                    return candidate['content']['parts'][0]['text'], result.get('usageMetadata', {})
+                            # e.g. MAX_TOKENS or SAFETY without any text
+                            last_error = f"{model_name} returned no text (finishReason {candidate.get('finishReason')})"
+                        else:
+                            block_reason = result.get('promptFeedback', {}).get('blockReason')
+                            last_error = f"{model_name} returned no candidates (blockReason {block_reason})"
+                    else:
+                        error_text = await resp.text()
+                        last_error = f"Status {resp.status}: {error_text[:200]}"
+                        if 'thinking' in error_text.lower() and 'thinkingConfig' in data['generationConfig']:
+                            # Models that don't think reject thinkingConfig, send the rest without it
+                            data = dict(data, generationConfig={key: value for key, value in data['generationConfig'].items()
+                                                                if key != 'thinkingConfig'})
+                        continue
+            except Exception as e:
+                last_error = str(e)
+                continue
+
+    error_msg = "Could not analyze image with Gemini API. "
+    if last_error:
+        error_msg += f"Last error: {last_error}. "
+    error_msg += "Tried listing models and common model names. Please check your API key has vision access."
+    raise Exception(error_msg)
+
+
+def verification_request(image_base64, content_type, fields=VERIFY_FIELDS, previous_answer=None):
+    """
+    generateContent body for the screenshot. With `previous_answer` it is a follow-up
+    turn that only asks for `fields` again (and only allows those in the schema).
+    """
+    contents = [{
+        "role": "user",
+        "parts": [
+            {"text": VERIFY_PROMPT},
+            {
+                "inline_data": {
+                    "mime_type": content_type or "image/png",
+                    "data": image_base64
+                }
+            }
+        ]
+    }]
+    schema = VERIFY_SCHEMA
+    if previous_answer is not None:
+        contents.append({"role": "model", "parts": [{"text": previous_answer}]})
+        contents.append({"role": "user", "parts": [{"text":
+            f"Look at the screenshot again and read only: {', '.join(fields)}. "
+            "The level and rating are the numbers right after 'Level:' and 'Rating:'."}]})
+        schema = {
+            "type": "OBJECT",
+            "properties": {name: VERIFY_SCHEMA["properties"][name] for name in (*fields, "confidence")},
+            "required": list(fields),
+        }
+    return {
+        "contents": contents,
+        "generationConfig": {
+            "temperature": 0,
+            "maxOutputTokens": VERIFY_MAX_OUTPUT_TOKENS,
+            "responseMimeType": "application/json",
+            "responseSchema": schema,
+            "thinkingConfig": {"thinkingBudget": 0},
+        }
+    }
+
+
+def validate_verification(answer_text):
+    """
+    Checks an answer against VERIFY_SCHEMA.
+    Returns ({field: value or None}, [fields to ask again]).
+    """
+    try:
+        answer = json.loads(answer_text)
+    except (TypeError, ValueError):
+        # A model without schema support may still answer "Username: ..." lines
+        answer = dict(zip(VERIFY_FIELDS, parse_verification(answer_text)))
+    if not isinstance(answer, dict):
+        answer = {}
+
+    values = {}
+    username = answer.get('username')
+    values['username'] = username.strip() if isinstance(username, str) and username.strip() not in ('', 'N/A') else None
+    for name in ('level', 'rating'):
+        value = answer.get(name)
+        if isinstance(value, str):
+            value = parse_number(value)
+        values[name] = value if isinstance(value, int) and not isinstance(value, bool) and value >= 0 else None
+
+    missing = [name for name in VERIFY_FIELDS if values[name] is None]
+    # No confidence means the model was sure
+    confidence = answer.get('confidence')
+    if isinstance(confidence, (int, float)) and confidence < MIN_CONFIDENCE:
+        missing = list(VERIFY_FIELDS)
+    return values, missing
+
+
+async def analyze_verification_image(session, gemini_api_key, models_to_try, image_data, content_type, usage=None):
+    """
+    Reads (username, level, rating) from the screenshot, "N/A" for anything missing.
+    Fields that are missing (or a low-confidence answer) are asked for once more in a
+    follow-up turn. `usage`, if given, is a dict that collects calls and token counts.
+    Raises an Exception describing the last error if no model answered.
+    """
+    import base64  # only needed here
+
+    image_base64 = base64.b64encode(image_data).decode('utf-8')
+    usage = {} if usage is None else usage
+
+    def count(metadata):
+        usage['calls'] = usage.get('calls', 0) + 1
+        usage['prompt_tokens'] = usage.get('prompt_tokens', 0) + metadata.get('promptTokenCount', 0)
+        usage['output_tokens'] = usage.get('output_tokens', 0) + metadata.get('candidatesTokenCount', 0)
+
+    answer_text, metadata = await generate_content(
+        session, gemini_api_key, models_to_try, verification_request(image_base64, content_type))
+    count(metadata)
+    values, missing = validate_verification(answer_text)
+
+    if missing:
+        usage['reasked'] = usage.get('reasked', 0) + 1
+        try:
+            retry_text, metadata = await generate_content(
+                session, gemini_api_key, models_to_try,
+                verification_request(image_base64, content_type, missing, previous_answer=answer_text))
+            count(metadata)
+            retry_values, _ = validate_verification(retry_text)
+            for name in missing:
+                if retry_values[name] is not None:
+                    values[name] = retry_values[name]
+        except Exception:
+            # Keep what the first answer had
+            report_exception('analyze_verification_image.reask', level=logging.WARNING, fields=missing)
+
+    event('gemini', "Verification analysed", calls=usage.get('calls'), output_tokens=usage.get('output_tokens'),
+          reasked=missing, unread=[name for name in VERIFY_FIELDS if values[name] is None])
+    return tuple(values[name] if values[name] is not None else "N/A" for name in VERIFY_FIELDS)
+
+
+async def analyze_screenshot(gemini_api_key, models_to_try, image_data, content_type):
+    """
+    analyze_verification_image with its own HTTP session. This is the job sent to an
+    AI worker process when AI_WORKERS is set, so it only takes picklable arguments.
+    """
+    async with aiohttp.ClientSession() as session:
+        return await analyze_verification_image(session, gemini_api_key, models_to_try, image_data, content_type)
+
+
+def parse_verification(analysis_text):
+    """Extracts (username, level, rating) from a "Username: ...\nLevel: ...\nRating: ..." answer, "N/A" for anything missing"""
+    username = "N/A"
+    level = "N/A"
+    rating = "N/A"
+
+    if analysis_text:
+        for line in analysis_text.split('\n'):
+            if 'Username:' in line:
+                username = line.split('Username:')[1].strip()
+            elif 'Level:' in line:
+                level = line.split('Level:')[1].strip()
+            elif 'Rating:' in line:
+                rating = line.split('Rating:')[1].strip()
+
+    return username, level, rating
+
+
+def verification_roles(guild):
+    """(peasant, member, guest) roles of the guild, any of them may be None"""
+    return find_role(guild, "peasant"), find_role(guild, "member"), find_role(guild, "guest")
+
+
+def verified_role_list(guild, member, peasant_role, member_role, guest_role):
+    """
+    The member's role list after verification (peasant + member added, guest removed),
+    or None if nothing would change or the bot can't manage roles.
+    """
+    me = guild.me
+    if not peasant_role or not me.guild_permissions.manage_roles:
+        return None
+
+    roles = list(member.roles)
+    for role in (peasant_role, member_role):
+        if role and me.top_role > role and role not in roles:
+            roles.append(role)
+    if guest_role and me.top_role > guest_role and guest_role in roles:
+        roles.remove(guest_role)
+
+    if set(roles) == set(member.roles):
+        return None
+    # @everyone can't be passed to member.edit
+    return [role for role in roles if not role.is_default()]
+
+
+def format_verification_message(username, level, rating, peasant_role, member):
+    """Message posted to the verification channel"""
+    # Format the message according to specification
+    return f"""Username on Roblox: {username}
+Level: {level}
+Rating: {rating}
+Proof:
+{peasant_role.mention if peasant_role else "@Peasant"} {member.mention}"""
+
+
+class Verify(commands.Cog):
+    """!verify and !verifybacklog"""
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    async def register_players(self, ctx, guild, results):
+        """Store (member, username, level, rating) results in the player registry"""
+        def record_all():
+            for member, username, level, rating in results:
+                if username != "N/A":
+                    self.bot.players.record(member.id, guild.id, username, level, rating)
+        try:
+            await asyncio.to_thread(record_all)
+        except Exception:
+            report_exception('verify.register_players', ctx)
+
+    async def send_status(self, ctx, text):
+        """Progress message that doesn't abort the command if it can't be sent"""
+        try:
+            await self.bot.outbox.send(ctx.channel, text, priority=LOW)
+        except Exception:
+            report_exception('verify.status', ctx, level=logging.WARNING)
+
+    @commands.command(name='verify')
+    async def verify_user(self, ctx):
+        """
+        Analyzes an image to extract Roblox username, level, and rating.
+        Then sends a formatted message and assigns the peasant role.
+
+        Usage: !verify (with an image attached)
+        """
+        try:
+            # Check if command is used in a server (not DM)
+            if ctx.guild is None:
+                await ctx.send("❌ This command can only be used in a server, not in direct messages.")
+                return
+
+            # Check if user already has peasant role
+            peasant_role = find_role(ctx.guild, "peasant")
+
+            if peasant_role and peasant_role in ctx.author.roles:
+                await ctx.send("✅ You are already verified!")
+                return
+
+            # Check if message has attachments
+            if not ctx.message.attachments:
+                await ctx.send("❌ Please attach an image with the `!verify` command.")
+                return
+
+            # Get the first image attachment
+            attachment = ctx.message.attachments[0]
+
+            # Check if it's an image
+            if not attachment.content_type or not attachment.content_type.startswith('image/'):
+                await ctx.send("❌ Please attach a valid image file.")
+                return
+
+            gemini_api_key = get_gemini_key()
+
+            if not gemini_api_key:
+                await ctx.send("❌ Gemini API key not configured. Please add GEMINI_API_KEY to your .env file.")
+                return
+
+            # The status message, the download and the model lookup don't depend on each other.
+            # Replies below wait for the status message so they never overtake it.
+            status_message = asyncio.create_task(self.send_status(ctx, "🔍 Analyzing image..."))
+
+            async with aiohttp.ClientSession() as session:
+                async def download():
+                    async with session.get(attachment.url) as resp:
+                        return await resp.read() if resp.status == 200 else None
+
+                image_data, models_to_try = await asyncio.gather(
+                    download(), find_gemini_models(session, gemini_api_key))
+                if image_data is None:
+                    await status_message
+                    await ctx.send("❌ Failed to download the image.")
+                    return
+
+            # Analyze image with Gemini API (in an AI worker process if enabled)
+            try:
+                username, level, rating = await ai_workers.run(
+                    analyze_screenshot, gemini_api_key, models_to_try, image_data, attachment.content_type)
+            except Exception as gemini_error:
+                report_exception('verify_user.analyze', ctx)
+                await status_message
+                await ctx.send(f"❌ Error analyzing image with Gemini: {str(gemini_error)}")
+                return
+
+            peasant_role, member_role, guest_role = verification_roles(ctx.guild)
+            target_channel = self.bot.get_channel(VERIFY_CHANNEL_ID)
+
+            async def apply_roles():
+                # One member.edit instead of up to three add_roles/remove_roles calls
+                roles = verified_role_list(ctx.guild, ctx.author, peasant_role, member_role, guest_role)
+                if roles is None:
+                    return
+                try:
+                    await ctx.author.edit(roles=roles, reason="Verified via !verify command")
+                except discord.Forbidden:
+                    report_exception('verify_user.roles', ctx, level=logging.WARNING)
+                except Exception:
+                    report_exception('verify_user.roles', ctx)
+
+            async def post_verification():
+                if not target_channel:
+                    return False
+                formatted_message = format_verification_message(username, level, rating, peasant_role, ctx.author)
+                # Send to the target channel with the image attached
+                image_file = discord.File(io.BytesIO(image_data), filename=f"verification_{ctx.author.id}.png")
+                await self.bot.outbox.send(target_channel, formatted_message, priority=NORMAL, file=image_file)
+                return True
+
+            # Registry, roles and the verification post only need the analysis result
+            _, _, posted = await asyncio.gather(
+                self.register_players(ctx, ctx.guild, [(ctx.author, username, level, rating)]),
+                apply_roles(),
+                post_verification())
+            await status_message
+
+            if not posted:
+                await ctx.send("❌ Could not find the target channel.")
+                return
+
+            # Confirm to user in the channel they used
+            await self.bot.outbox.send(ctx.channel, "✅ Verification complete! Message sent to the verification channel.", priority=LOW)
+
+        except Exception as e:
+            # Prevent propagation to on_command_error to avoid duplicate messages
+            # Most errors are already handled above with specific messages
+            report_exception('verify_user', ctx)
+
+    @commands.command(name='verifybacklog')
+    async def verify_backlog(self, ctx, channel: Optional[discord.TextChannel] = None, limit: int = 200, after_id: int = None, before_id: int = None):
+        """
+        Runs every unprocessed verification screenshot in a channel through the verify pipeline.
+        Only the newest image of each unverified member is used.
+
+        Usage: !verifybacklog [#channel] [limit] [after_message_id] [before_message_id]
+
+        Example: !verifybacklog #verify 500
+        """
+        try:
+            # Check if command is used in a server (not DM)
+            if ctx.guild is None:
+                await ctx.send("❌ This command can only be used in a server, not in direct messages.")
+                return
+
+            # Check if user has admin/manage server permissions
+            if not ctx.author.guild_permissions.manage_guild and not ctx.author.guild_permissions.administrator:
+                await ctx.send("❌ You don't have permission to use this command.")
+                return
+
+            channel = channel or ctx.channel
+            gemini_api_key = get_gemini_key()
+            if not gemini_api_key:
+                await ctx.send("❌ Gemini API key not configured. Please add GEMINI_API_KEY to your .env file.")
+                return
+
+            target_channel = self.bot.get_channel(VERIFY_CHANNEL_ID)
+            if not target_channel:
+                await ctx.send("❌ Could not find the target channel.")
+                return
+
+            # Roles are resolved once for the whole run
+            peasant_role, member_role, guest_role = verification_roles(ctx.guild)
+
+            # Collect the newest image per unverified member
+            started = time.perf_counter()
+            pending = {}
+            async for message in channel.history(
+                limit=limit,
+                after=discord.Object(id=after_id) if after_id else None,
+                before=discord.Object(id=before_id) if before_id else None,
+                oldest_first=False,
+            ):
+                member = message.author
+                if member.bot or not isinstance(member, discord.Member) or member.id in pending:
+                    continue
+                if peasant_role and peasant_role in member.roles:
+                    continue
+                attachment = next((a for a in message.attachments
+                                   if a.content_type and a.content_type.startswith('image/')), None)
+                if attachment:
+                    # history() is newest first, so the first image seen is the newest one
+                    pending[member.id] = (member, message, attachment)
+
+            if not pending:
+                await ctx.send(f"✅ No unprocessed verification screenshots found in {channel.mention}.")
+                return
+
+            await self.bot.outbox.send(ctx.channel, f"🔍 Processing {len(pending)} verification screenshot(s) from {channel.mention}...", priority=LOW)
+
+            results = []  # (member, message, status, username, level, rating, image_data)
+            semaphore = asyncio.Semaphore(config.settings.verify_backlog_concurrency)
+
+            async with aiohttp.ClientSession() as session:
+                models_to_try = await find_gemini_models(session, gemini_api_key)
+
+                async def process(member, message, attachment):
+                    async with semaphore:
+                        try:
+                            async with session.get(attachment.url) as resp:
+                                if resp.status != 200:
+                                    results.append((member, message, f"download failed ({resp.status})", None, None, None, None))
+                                    return
+                                image_data = await resp.read()
+                            username, level, rating = await ai_workers.run(
+                                analyze_screenshot, gemini_api_key, models_to_try, image_data, attachment.content_type)
+                            results.append((member, message, "verified", username, level, rating, image_data))
+                        except Exception as e:
+                            report_exception('verify_backlog.process', ctx, user=member.id, message=message.id)
+                            results.append((member, message, f"analysis failed: {str(e)[:100]}", None, None, None, None))
+
+                await asyncio.gather(*(process(*item) for item in pending.values()))
+
+            verified = [r for r in results if r[2] == "verified"]
+            await self.register_players(ctx, ctx.guild, [(member, username, level, rating)
+                                                         for member, _, _, username, level, rating, _ in verified])
+
+            # What went wrong after the analysis, per member, for the report
+            issues = {}
+
+            # Role changes: one member.edit per member instead of up to three add/remove calls
+            async def apply_roles(member):
+                roles = verified_role_list(ctx.guild, member, peasant_role, member_role, guest_role)
+                if roles is None:
+                    return
+                async with semaphore:
+                    try:
+                        await member.edit(roles=roles, reason="Verified via !verifybacklog")
+                    except Exception as e:
+                        report_exception('verify_backlog.roles', ctx, level=logging.WARNING, user=member.id)
+                        issues.setdefault(member.id, []).append(f"roles not changed: {str(e)[:100]}")
+
+            await asyncio.gather(*(apply_roles(r[0]) for r in verified))
+
+            # Result posts: up to 10 images per message (Discord's attachment limit), no more than
+            # the guild's upload limit in total and no more text than fits in one message
+            batches = []
+            batch, batch_bytes, batch_text = [], 0, 0
+            for result in verified:
+                member, _, _, username, level, rating, image_data = result
+                text_length = len(format_verification_message(username, level, rating, peasant_role, member)) + 2
+                # A screenshot over the limit on its own is posted without the image
+                size = len(image_data) if len(image_data) <= ctx.guild.filesize_limit else 0
+                if batch and (len(batch) == 10 or batch_bytes + size > ctx.guild.filesize_limit
+                              or batch_text + text_length > 2000):
+                    batches.append(batch)
+                    batch, batch_bytes, batch_text = [], 0, 0
+                batch.append(result)
+                batch_bytes += size
+                batch_text += text_length
+            if batch:
+                batches.append(batch)
+
+            for batch in batches:
+                text = "\n\n".join(format_verification_message(username, level, rating, peasant_role, member)
+                                   for member, _, _, username, level, rating, _ in batch)
+                files = []
+                for member, _, _, _, _, _, image_data in batch:
+                    if len(image_data) > ctx.guild.filesize_limit:
+                        issues.setdefault(member.id, []).append("screenshot too large to attach")
+                    else:
+                        files.append(discord.File(io.BytesIO(image_data), filename=f"verification_{member.id}.png"))
+                try:
+                    await self.bot.outbox.send(target_channel, text[:2000], priority=NORMAL, files=files)
+                except Exception as e:
+                    report_exception('verify_backlog.post', ctx, users=[r[0].id for r in batch])
+                    for member, *_ in batch:
+                        issues.setdefault(member.id, []).append(f"post failed: {str(e)[:100]}")
+
+            # Summary report
+            elapsed = time.perf_counter() - started
+            lines = []
+            for member, message, status, username, level, rating, _ in results:
+                if status == "verified":
+                    status = "; ".join(["verified", *issues.get(member.id, [])])
+                    status += f"\t{username} / level {level} / rating {rating}"
+                lines.append(f"{member} ({member.id})\tmessage {message.id}\t{status}")
+            report = "\n".join(lines) + "\n"
+            problems = f", {len(issues)} with problems (see the report)" if issues else ""
+            await ctx.send(
+                f"✅ Backlog done: {len(verified)}/{len(results)} verified{problems} in {elapsed:.1f}s "
+                f"({len(results) / max(elapsed, 0.001):.2f} items/s).",
+                file=discord.File(io.BytesIO(report.encode('utf-8')), filename="verify-backlog.txt"))
+
+        except Exception as e:
+            # Prevent propagation to on_command_error to avoid duplicate messages
+            report_exception('verify_backlog', ctx)
+
+
+async def setup(bot):
+    await bot.add_cog(Verify(bot))
@@ -0,0 +1,105 @@
+"""
+Settings shared by the bot core and the command extensions in cogs/.
+
+Environment-driven settings are read once into `settings` (a frozen Settings
+object). Code reads them as `config.settings.<name>` at the point of use, so a
+reload (`!config reload` or SIGHUP) is picked up without touching the disk on
+every command.
+"""
+import os
+from dataclasses import dataclass, fields
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from dotenv import load_dotenv
+
+# Poland timezone (handles UTC+1/+2 automatically)
+POLAND_TZ = ZoneInfo("Europe/Warsaw")
+
+# Channel to clear and send warnings / welcomes
+TARGET_CHANNEL_ID = 1440064713584279632
+
+# Upper bound for `!profile` / `/debug/profile` durations
+MAX_PROFILE_SECONDS = 120
+
+# Extensions that hold the commands, events and tasks (reloadable with !reload)
+EXTENSIONS = ('cogs.chat', 'cogs.verify', 'cogs.players', 'cogs.scheduler', 'cogs.admin')
+
+
+def _flag(name, default=False):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _int(name, default):
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+@dataclass(frozen=True)
+class Settings:
+    discord_bot_token: Optional[str]
+    gemini_api_key: Optional[str]
+    # Gemini REST endpoint (a proxy or local mock can be put here)
+    gemini_api_base: str
+    # Enables the /debug/* profiling endpoints on the health server
+    profiler_token: Optional[str]
+    # SQLite files (only read at startup)
+    state_db: str
+    players_db: str
+    # Archive the channel history (compressed JSONL) before every clear
+    archive_before_clear: bool
+    archive_dir: str
+    # Parallelism of !verifybacklog and !sendmessage broadcasts
+    verify_backlog_concurrency: int
+    broadcast_concurrency: int
+    # Worker processes for the Gemini calls of !bot and !verify, 0 = run them in the bot process (only read at startup)
+    ai_workers: int
+    # !bot conversation memory: recent-turn budget per channel and total across channels, in tokens (only read at startup)
+    chat_history_tokens: int
+    chat_memory_tokens: int
+
+
+def load_settings(override=False):
+    """Read .env (once per call) and the environment into a Settings object"""
+    load_dotenv(override=override)
+    return Settings(
+        discord_bot_token=os.getenv('DISCORD_BOT_TOKEN'),
+        gemini_api_key=os.getenv('GEMINI_API_KEY'),
+        gemini_api_base=os.getenv('GEMINI_API_BASE', 'https://generativelanguage.googleapis.com').rstrip('/'),
+        profiler_token=os.getenv('PROFILER_TOKEN') or None,
+        state_db=os.getenv('STATE_DB', 'bot_state.db'),
+        players_db=os.getenv('PLAYERS_DB', 'players.db'),
+        archive_before_clear=_flag('ARCHIVE_BEFORE_CLEAR'),
+        archive_dir=os.getenv('ARCHIVE_DIR', 'archives'),
+        verify_backlog_concurrency=max(_int('VERIFY_BACKLOG_CONCURRENCY', 4), 1),
+        broadcast_concurrency=max(_int('BROADCAST_CONCURRENCY', 5), 1),
+        ai_workers=max(_int('AI_WORKERS', 0), 0),
+        chat_history_tokens=max(_int('CHAT_HISTORY_TOKENS', 600), 0),
+        chat_memory_tokens=max(_int('CHAT_MEMORY_TOKENS', 200000), 1000),
+    )
+
+
+# Settings a reload stores but the bot only uses at startup, they need a restart
+RESTART_ONLY = ('state_db', 'players_db', 'ai_workers', 'chat_history_tokens', 'chat_memory_tokens')
+# Read by bot_logging.setup_logging, outside Settings, also only at startup
+RESTART_ONLY_ENV = ('LOG_LEVEL', 'LOG_FILE', 'LOG_SAMPLE_RATES', 'LOG_ERROR_INTERVAL')
+
+
+def reload_settings():
+    """
+    Re-read .env (overriding the environment) and swap in the new settings.
+    Returns the names of the settings that changed.
+    """
+    global settings
+    new = load_settings(override=True)
+    changed = [f.name for f in fields(Settings) if getattr(new, f.name) != getattr(settings, f.name)]
+    settings = new
+    return changed
+
+
+settings = load_settings()
@@ -0,0 +1,133 @@
+"""
+Per-channel conversation memory for !bot.
+
+Each channel keeps its recent turns in a ring buffer that is bounded by both a
+number of turns and a token budget. Turns pushed out of the buffer wait in an
+overflow list, and still go into the prompt, until enough of them have piled up
+(half the history budget by default) to be worth folding into the channel's short
+rolling summary in one model call (see cogs/chat.py, `fallback_summary` if that
+fails). Summarizing every time a turn falls out would double the Gemini calls. All channels
+together are capped at a total token count; the least recently used channels
+are dropped first. Token counts are estimates (~4 characters per token), good
+enough for budgeting without a tokenizer.
+"""
+import time
+from collections import OrderedDict, deque
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4) if text else 0
+
+
+class ChannelMemory:
+    __slots__ = ('turns', 'overflow', 'summary', 'last_used')
+
+    def __init__(self, max_turns):
+        self.turns = deque(maxlen=max_turns)  # (speaker, text, tokens)
+        self.overflow = []
+        self.summary = ""
+        self.last_used = time.monotonic()
+
+    def overflow_tokens(self):
+        return sum(tokens for _, _, tokens in self.overflow)
+
+    def tokens(self):
+        return (sum(tokens for _, _, tokens in self.turns) + sum(tokens for _, _, tokens in self.overflow)
+                + estimate_tokens(self.summary))
+
+
+class ConversationMemory:
+    """Ring buffer + rolling summary per channel, LRU-capped across channels"""
+
+    def __init__(self, history_tokens=600, max_turns=12, summary_tokens=120, max_total_tokens=200_000,
+                 summarize_after_tokens=None):
+        self.history_tokens = history_tokens
+        # Overflow collected before it is summarized
+        self.summarize_after_tokens = history_tokens // 2 if summarize_after_tokens is None else summarize_after_tokens
+        self.max_turns = max_turns
+        self.summary_tokens = summary_tokens
+        self.max_total_tokens = max_total_tokens
+        self._channels = OrderedDict()
+        self.total_tokens = 0
+        self.evicted_channels = 0
+
+    def _get(self, channel_id, create=False):
+        memory = self._channels.get(channel_id)
+        if memory is None and create:
+            memory = self._channels[channel_id] = ChannelMemory(self.max_turns)
+        if memory is not None:
+            self._channels.move_to_end(channel_id)
+            memory.last_used = time.monotonic()
+        return memory
+
+    def render(self, channel_id):
+        """(summary, recent turns as "speaker: text" lines) for the prompt, empty if nothing is remembered"""
+        memory = self._get(channel_id)
+        if memory is None:
+            return "", ""
+        # Turns waiting to be summarized are not in the summary yet, so they still go in
+        return memory.summary, "\n".join(f"{speaker}: {text}"
+                                         for speaker, text, _ in (*memory.overflow, *memory.turns))
+
+    def add(self, channel_id, speaker, text):
+        """Append a turn; turns over the turn/token budget move to the overflow awaiting summary"""
+        memory = self._get(channel_id, create=True)
+        before = memory.tokens()
+        if len(memory.turns) == memory.turns.maxlen:
+            memory.overflow.append(memory.turns.popleft())
+        memory.turns.append((speaker, text, estimate_tokens(text)))
+        while len(memory.turns) > 1 and sum(tokens for _, _, tokens in memory.turns) > self.history_tokens:
+            memory.overflow.append(memory.turns.popleft())
+        self.total_tokens += memory.tokens() - before
+        self._evict(keep=channel_id)
+
+    def take_overflow(self, channel_id):
+        """
+        (current summary, turns to fold into it) and clears the overflow, or (None, [])
+        while the overflow is still under `summarize_after_tokens`
+        """
+        memory = self._get(channel_id)
+        if memory is None or not memory.overflow or memory.overflow_tokens() < self.summarize_after_tokens:
+            return None, []
+        overflow, memory.overflow = memory.overflow, []
+        self.total_tokens -= sum(tokens for _, _, tokens in overflow)
+        return memory.summary, [(speaker, text) for speaker, text, _ in overflow]
+
+    def set_summary(self, channel_id, summary):
+        memory = self._get(channel_id)
+        if memory is None:
+            return  # Evicted while the summary was being written
+        # Never let a long summary eat the history budget
+        summary = summary.strip()[:self.summary_tokens * 4]
+        self.total_tokens += estimate_tokens(summary) - estimate_tokens(memory.summary)
+        memory.summary = summary
+        self._evict(keep=channel_id)
+
+    def forget(self, channel_id):
+        memory = self._channels.pop(channel_id, None)
+        if memory is not None:
+            self.total_tokens -= memory.tokens()
+
+    def _evict(self, keep):
+        while self.total_tokens > self.max_total_tokens and len(self._channels) > 1:
+            channel_id = next(iter(self._channels))
+            if channel_id == keep:
+                break
+            self.forget(channel_id)
+            self.evicted_channels += 1
+
+    def stats(self, channel_id=None):
+        stats = {'channels': len(self._channels), 'total_tokens': self.total_tokens,
+                 'max_total_tokens': self.max_total_tokens, 'evicted_channels': self.evicted_channels}
+        memory = self._channels.get(channel_id)
+        if memory is not None:
+            stats.update(turns=len(memory.turns), history_tokens=sum(tokens for _, _, tokens in memory.turns),
+                         overflow_tokens=memory.overflow_tokens(), summary_tokens=estimate_tokens(memory.summary))
+        return stats
+
+
+def fallback_summary(summary, turns, summary_tokens=120):
+    """Summary without a model call: the start of each turn appended, oldest text dropped first"""
+    lines = [summary] if summary else []
+    lines.extend(f"{speaker}: {text[:80]}" for speaker, text in turns)
+    return " | ".join(lines)[-summary_tokens * 4:]
@@ -0,0 +1,133 @@
+"""
+HTTP health check for UptimeRobot, plus the token-protected /debug/* profiling
+endpoints. Flask and the profiler are only imported when the server starts, in
+the server's own thread.
+"""
+import asyncio
+import hmac
+import logging
+import re
+from threading import Thread
+
+import config
+from bot_logging import log
+
+# "GET /debug/tasks?x=1 HTTP/1.1" -> "GET /debug/tasks HTTP/1.1"
+_QUERY_STRING = re.compile(r'((?:GET|HEAD|POST|PUT|PATCH|DELETE|OPTIONS) [^\s?"]*)\?[^\s"]*')
+
+
+class _ScrubQueryFilter(logging.Filter):
+    """Drops query strings from werkzeug's access log lines, so nothing secret from a URL reaches the log"""
+
+    def filter(self, record):
+        record.msg = _QUERY_STRING.sub(r'\1', record.getMessage())
+        record.args = None
+        return True
+
+
+def create_app(bot):
+    """Build the Flask app serving health checks and debug endpoints for `bot`"""
+    from flask import Flask, Response, request
+    import profiler
+
+    # Create Flask app for UptimeRobot health check
+    app = Flask(__name__)
+
+    @app.route('/')
+    @app.route('/health')
+    @app.route('/uptime')
+    def health_check():
+        """Health check endpoint for UptimeRobot"""
+        return "ok", 200
+
+    def _debug_authorized():
+        """Debug endpoints are only enabled when PROFILER_TOKEN is set and the caller sends it"""
+        token = config.settings.profiler_token
+        if not token:
+            return False
+        # Header only: query strings end up in access logs
+        supplied = request.headers.get('X-Profiler-Token', '')
+        return hmac.compare_digest(supplied.encode(), token.encode())
+
+    def _run_on_bot_loop(coro, timeout):
+        """Run a coroutine on the bot's event loop from the Flask thread and wait for the result"""
+        return asyncio.run_coroutine_threadsafe(coro, bot.loop).result(timeout)
+
+    def _file_response(data, filename, mimetype='text/plain'):
+        return Response(data, mimetype=mimetype,
+                        headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+    @app.route('/debug/profile/<kind>')
+    def debug_profile(kind):
+        """Sampling profiler (kind=sample) or cProfile (kind=cprofile) for ?seconds=N"""
+        if not _debug_authorized():
+            return "not found", 404
+        if not bot.is_ready():
+            return "bot not ready", 503
+        try:
+            seconds = max(1.0, min(float(request.args.get('seconds', 10)), config.MAX_PROFILE_SECONDS))
+        except ValueError:
+            return "seconds must be a number", 400
+
+        if kind not in ('sample', 'cprofile'):
+            return "unknown profiler", 404
+        if profiler._profile_lock.locked():
+            return "a profile is already running", 409
+
+        if kind == 'sample':
+            collapsed, _ = _run_on_bot_loop(profiler.sample(seconds), seconds + 30)
+            return _file_response(collapsed, 'profile.collapsed')
+
+        report, dump = _run_on_bot_loop(profiler.cprofile(seconds), seconds + 30)
+        if request.args.get('format') == 'prof':
+            return _file_response(dump, 'cprofile.prof', 'application/octet-stream')
+        return _file_response(report, 'cprofile.txt')
+
+    @app.route('/debug/memory/<action>')
+    def debug_memory(action):
+        """tracemalloc control: start, snapshot, diff, stop"""
+        if not _debug_authorized():
+            return "not found", 404
+        if action == 'start':
+            return profiler.memory_start(), 200
+        if action == 'snapshot':
+            return profiler.memory_snapshot(), 200
+        if action == 'diff':
+            report = profiler.memory_diff()
+            if report is None:
+                return "need at least two snapshots", 409
+            return _file_response(report, 'tracemalloc-diff.txt')
+        if action == 'stop':
+            profiler.memory_stop()
+            return "tracemalloc stopped", 200
+        return "unknown action", 404
+
+    @app.route('/debug/tasks')
+    def debug_tasks():
+        """All pending asyncio tasks on the bot loop with their stacks"""
+        if not _debug_authorized():
+            return "not found", 404
+        if not bot.is_ready():
+            return "bot not ready", 503
+
+        async def run():
+            return profiler.dump_tasks()
+
+        return _file_response(_run_on_bot_loop(run(), 10), 'asyncio-tasks.txt')
+
+    return app
+
+
+def _serve(bot, host, port):
+    # Flask is imported here, in the server thread, so it doesn't delay the bot's login
+    app = create_app(bot)
+    logging.getLogger('werkzeug').addFilter(_ScrubQueryFilter())
+    log.info("Health check server started on http://%s:%d", host, port)
+    app.run(host=host, port=port, debug=False)
+
+
+def start(bot, host='0.0.0.0', port=8080):
+    """Run the Flask server in a separate thread"""
+    thread = Thread(target=_serve, args=(bot, host, port), name="health-server", daemon=True)
+    thread.start()
+    return thread
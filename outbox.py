@@ -0,0 +1,235 @@
+"""
+Central outbound message dispatcher.
+
+Everything the bot posts (countdowns, clear warnings, welcomes, verification
+posts, command confirmations) goes through `bot.outbox.send` instead of
+`channel.send`; plain command replies (`ctx.send`) are routed here as NORMAL
+messages by the bot's context class. Each channel gets its own priority queue and worker:
+
+- URGENT messages (countdowns, clear warnings) are sent before NORMAL ones
+  (welcomes, posts, replies), which go before LOW ones (command confirmations).
+- Adjacent LOW text messages for the same channel are merged into one send.
+- The worker keeps each channel under Discord's message bucket (5 messages per
+  5 seconds) itself, so a backlog waits in our queue, where priorities apply,
+  instead of in discord.py's rate-limit lock, where they don't. A 429 that still
+  gets through is waited out and the messages are put back in the queue.
+- Queue depth, queue wait and send latency are kept for `!outbox` and logged as
+  `outbox` events (sampleable via LOG_SAMPLE_RATES).
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+
+import discord
+
+from bot_logging import event, report_exception
+
+# Priorities, lower is sent first
+URGENT, NORMAL, LOW = 0, 1, 2
+PRIORITY_NAMES = {URGENT: 'urgent', NORMAL: 'normal', LOW: 'low'}
+
+# Discord's per-channel message bucket
+MESSAGES_PER_WINDOW = 5
+WINDOW_SECONDS = 5.0
+
+# Discord's message length limit, merged messages stay under it
+MAX_CONTENT_LENGTH = 2000
+
+# How often a message is put back after a 429 before giving up
+MAX_RATE_LIMIT_RETRIES = 3
+
+# Latency samples kept per priority for the percentiles
+LATENCY_SAMPLES = 500
+
+
+class _Outgoing:
+    __slots__ = ('priority', 'seq', 'content', 'kwargs', 'future', 'queued_at', 'retries')
+
+    def __init__(self, priority, seq, content, kwargs, future):
+        self.priority = priority
+        self.seq = seq
+        self.content = content
+        self.kwargs = kwargs
+        self.future = future
+        self.queued_at = time.perf_counter()
+        self.retries = 0
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    def mergeable(self):
+        return self.priority == LOW and not self.kwargs and isinstance(self.content, str)
+
+
+class _ChannelQueue:
+    __slots__ = ('channel', 'heap', 'wakeup', 'sent_at', 'task')
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.heap = []
+        self.wakeup = asyncio.Event()
+        # Send times within the current bucket window
+        self.sent_at = deque()
+        self.task = None
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class Outbox:
+    """Per-channel priority queues in front of `channel.send`"""
+
+    def __init__(self, idle_timeout=60.0):
+        self.idle_timeout = idle_timeout
+        self._queues = {}
+        self._seq = itertools.count()
+        # Metrics
+        self.latencies = {name: deque(maxlen=LATENCY_SAMPLES) for name in PRIORITY_NAMES.values()}
+        self.messages_sent = 0
+        self.sends = 0
+        self.merged = 0
+        self.rate_limited = 0
+        self.failed = 0
+        self.max_depth = 0
+
+    async def send(self, channel, content=None, priority=NORMAL, **kwargs):
+        """
+        Queue a message and wait until it is sent. Takes the same arguments as
+        `channel.send` and returns the sent message (shared by merged messages)
+        or raises what `channel.send` raised.
+        """
+        loop = asyncio.get_running_loop()
+        queue = self._queues.get(channel.id)
+        if queue is None or queue.task is None or queue.task.done():
+            queue = self._queues[channel.id] = _ChannelQueue(channel)
+            queue.task = loop.create_task(self._run(queue), name=f"outbox-{channel.id}")
+
+        item = _Outgoing(priority, next(self._seq), content, kwargs, loop.create_future())
+        heapq.heappush(queue.heap, item)
+        self.max_depth = max(self.max_depth, len(queue.heap))
+        queue.wakeup.set()
+        return await item.future
+
+    def depth(self):
+        """{channel id: queued messages}"""
+        return {channel_id: len(queue.heap) for channel_id, queue in self._queues.items() if queue.heap}
+
+    def stats(self):
+        latency = {}
+        for name, values in self.latencies.items():
+            if values:
+                latency[name] = {'count': len(values),
+                                 'p50_ms': round(_percentile(values, 0.5), 1),
+                                 'p95_ms': round(_percentile(values, 0.95), 1),
+                                 'max_ms': round(max(values), 1)}
+        return {'queued': self.depth(), 'max_depth': self.max_depth, 'messages_sent': self.messages_sent,
+                'sends': self.sends, 'merged': self.merged, 'rate_limited': self.rate_limited,
+                'failed': self.failed, 'latency': latency}
+
+    async def _run(self, queue):
+        while True:
+            if not queue.heap:
+                queue.wakeup.clear()
+                try:
+                    await asyncio.wait_for(queue.wakeup.wait(), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    if not queue.heap:
+                        # Idle channel, a new worker starts with the next message
+                        if self._queues.get(queue.channel.id) is queue:
+                            del self._queues[queue.channel.id]
+                        return
+                continue
+
+            # Wait for room in the bucket *before* picking the message, so anything
+            # more urgent queued meanwhile still goes first
+            await self._wait_for_bucket(queue)
+            batch = self._take(queue)
+            await self._deliver(queue, batch)
+
+    async def _wait_for_bucket(self, queue):
+        while True:
+            now = time.monotonic()
+            while queue.sent_at and now - queue.sent_at[0] >= WINDOW_SECONDS:
+                queue.sent_at.popleft()
+            if len(queue.sent_at) < MESSAGES_PER_WINDOW:
+                return
+            await asyncio.sleep(WINDOW_SECONDS - (now - queue.sent_at[0]))
+
+    def _take(self, queue):
+        """Highest-priority message, plus the LOW text messages right behind it if it is one"""
+        batch = [heapq.heappop(queue.heap)]
+        if batch[0].mergeable():
+            length = len(batch[0].content)
+            while (queue.heap and queue.heap[0].mergeable()
+                   and length + 1 + len(queue.heap[0].content) <= MAX_CONTENT_LENGTH):
+                item = heapq.heappop(queue.heap)
+                length += 1 + len(item.content)
+                batch.append(item)
+        # Callers that gave up waiting don't need their message any more
+        return [item for item in batch if not item.future.done()]
+
+    async def _deliver(self, queue, batch):
+        if not batch:
+            return
+        first = batch[0]
+        content = "\n".join(item.content for item in batch) if len(batch) > 1 else first.content
+
+        queue.sent_at.append(time.monotonic())
+        started = time.perf_counter()
+        try:
+            message = await queue.channel.send(content, **first.kwargs)
+        except discord.HTTPException as e:
+            if e.status == 429 and not first.kwargs.get('file') and not first.kwargs.get('files'):
+                self._requeue_after_rate_limit(queue, batch, e)
+            else:
+                self._fail(queue, batch, e)
+            return
+        except Exception as e:
+            self._fail(queue, batch, e)
+            return
+
+        sent = time.perf_counter()
+        self.sends += 1
+        self.messages_sent += len(batch)
+        self.merged += len(batch) - 1
+        for item in batch:
+            self.latencies[PRIORITY_NAMES[item.priority]].append((sent - item.queued_at) * 1000)
+            if not item.future.done():
+                item.future.set_result(message)
+        event('outbox', "Message sent", channel_id=queue.channel.id, priority=PRIORITY_NAMES[first.priority],
+              merged=len(batch), queued_ms=round((started - first.queued_at) * 1000, 1),
+              send_ms=round((sent - started) * 1000, 1), depth=len(queue.heap))
+
+    def _requeue_after_rate_limit(self, queue, batch, error):
+        """discord.py already retried and still got a 429: treat the bucket as full and try again later"""
+        self.rate_limited += 1
+        try:
+            retry_after = float(error.response.headers.get('Retry-After', WINDOW_SECONDS))
+        except (AttributeError, TypeError, ValueError):
+            retry_after = WINDOW_SECONDS
+        # Mark the bucket as used up for retry_after seconds
+        now = time.monotonic()
+        queue.sent_at.clear()
+        queue.sent_at.extend([now + retry_after - WINDOW_SECONDS] * MESSAGES_PER_WINDOW)
+
+        for item in batch:
+            item.retries += 1
+            if item.retries > MAX_RATE_LIMIT_RETRIES:
+                self._fail(queue, [item], error)
+            else:
+                # Same priority and sequence number, so it keeps its place in line
+                heapq.heappush(queue.heap, item)
+
+    def _fail(self, queue, batch, error):
+        self.failed += len(batch)
+        if not isinstance(error, discord.Forbidden):
+            report_exception('outbox.send', channel_id=queue.channel.id, messages=len(batch))
+        for item in batch:
+            if not item.future.done():
+                item.future.set_exception(error)
@@ -0,0 +1,99 @@
+"""
+Registry of verified players, filled by !verify / !verifybacklog.
+
+One SQLite row per Discord member with the Roblox username, level and rating
+read from the verification screenshot. Lookups by Discord ID or Roblox username
+and the rating/level leaderboards are all answered from indexes.
+"""
+import re
+import sqlite3
+import threading
+import time
+
+# Leaderboards can be sorted by these columns
+LEADERBOARD_FIELDS = ('rating', 'level')
+
+
+def parse_number(value):
+    """"1,234" / "Level 12" / "12/100" -> int (the first number), None for "N/A" or anything without digits"""
+    if value is None:
+        return None
+    match = re.search(r'\d[\d,]*', str(value))
+    return int(match.group().replace(',', '')) if match else None
+
+
+class PlayerRegistry:
+    """Verified players in a small SQLite database (WAL mode). Methods block, call them via asyncio.to_thread."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS players (
+                discord_id INTEGER PRIMARY KEY,
+                guild_id INTEGER NOT NULL,
+                roblox_username TEXT NOT NULL,
+                username_key TEXT NOT NULL,
+                level INTEGER,
+                rating INTEGER,
+                verified_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS players_username ON players (username_key);
+            CREATE INDEX IF NOT EXISTS players_rating ON players (guild_id, rating DESC);
+            CREATE INDEX IF NOT EXISTS players_level ON players (guild_id, level DESC);
+        """)
+
+    def record(self, discord_id, guild_id, roblox_username, level, rating):
+        """Insert or update the player from a verification result"""
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO players (discord_id, guild_id, roblox_username, username_key, level, rating, verified_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(discord_id) DO UPDATE SET guild_id = excluded.guild_id, "
+                "roblox_username = excluded.roblox_username, username_key = excluded.username_key, "
+                "level = excluded.level, rating = excluded.rating, verified_at = excluded.verified_at",
+                (discord_id, guild_id, roblox_username, roblox_username.lower(),
+                 parse_number(level), parse_number(rating), time.time()))
+
+    def by_discord_id(self, discord_id):
+        with self._lock:
+            row = self._db.execute("SELECT * FROM players WHERE discord_id = ?", (discord_id,)).fetchone()
+        return dict(row) if row else None
+
+    def by_username(self, roblox_username):
+        """Players with this Roblox username (case-insensitive), newest verification first"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM players WHERE username_key = ? ORDER BY verified_at DESC",
+                (roblox_username.lower(),)).fetchall()
+        return [dict(row) for row in rows]
+
+    def rank(self, guild_id, field, value):
+        """1-based position of `value` on the guild's leaderboard for `field`"""
+        if field not in LEADERBOARD_FIELDS or value is None:
+            return None
+        with self._lock:
+            (higher,) = self._db.execute(
+                f"SELECT COUNT(*) FROM players WHERE guild_id = ? AND {field} > ?", (guild_id, value)).fetchone()
+        return higher + 1
+
+    def leaderboard(self, guild_id, field, page, per_page=10):
+        """(rows of the page, number of ranked players) for the guild, sorted by `field` descending"""
+        if field not in LEADERBOARD_FIELDS:
+            raise ValueError(f"Unknown leaderboard field: {field}")
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT * FROM players WHERE guild_id = ? AND {field} IS NOT NULL "
+                f"ORDER BY {field} DESC LIMIT ? OFFSET ?",
+                (guild_id, per_page, (page - 1) * per_page)).fetchall()
+            (total,) = self._db.execute(
+                f"SELECT COUNT(*) FROM players WHERE guild_id = ? AND {field} IS NOT NULL", (guild_id,)).fetchone()
+        return [dict(row) for row in rows], total
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,166 @@
+"""
+On-demand profiling helpers for the live bot.
+
+Nothing in here runs until an admin asks for it: the sampling thread, cProfile
+and tracemalloc are only switched on for the duration of a request, so the
+overhead while idle is zero.
+"""
+import asyncio
+import cProfile
+import io
+import marshal
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+# Only one CPU profile may run at a time
+_profile_lock = asyncio.Lock()
+
+# tracemalloc snapshots taken with `!profile mem snapshot` (oldest first)
+MAX_SNAPSHOTS = 5
+_snapshots = []
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of one thread at a fixed interval from a background thread.
+    Results are returned as collapsed stacks ("a;b;c count"), the input format
+    of flamegraph.pl / speedscope / inferno.
+    """
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self.sample_count = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+            self.sample_count += 1
+            del frame
+
+    def collapsed(self):
+        """Return the samples as collapsed-stack text"""
+        lines = [f"{stack} {count}" for stack, count in self.samples.most_common()]
+        return "\n".join(lines) + "\n"
+
+
+async def sample(duration, interval=0.005):
+    """
+    Run the sampling profiler against the event loop thread for `duration` seconds.
+    Returns (collapsed stacks as bytes, number of samples).
+    """
+    async with _profile_lock:
+        profiler = SamplingProfiler(threading.get_ident(), interval=interval)
+        profiler.start()
+        try:
+            await asyncio.sleep(duration)
+        finally:
+            profiler.stop()
+        return profiler.collapsed().encode('utf-8'), profiler.sample_count
+
+
+async def cprofile(duration, limit=60):
+    """
+    Enable cProfile on the event loop thread for `duration` seconds.
+    Returns (pstats text report, raw .prof dump) as bytes.
+    """
+    async with _profile_lock:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            await asyncio.sleep(duration)
+        finally:
+            profiler.disable()
+
+        report = io.StringIO()
+        stats = pstats.Stats(profiler, stream=report)
+        stats.sort_stats('cumulative').print_stats(limit)
+        profiler.create_stats()
+        return report.getvalue().encode('utf-8'), marshal.dumps(profiler.stats)
+
+
+def memory_start(frames=25):
+    """Start tracemalloc (if needed) and take a baseline snapshot"""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+    _snapshots.clear()
+    return memory_snapshot()
+
+
+def memory_snapshot():
+    """Take a tracemalloc snapshot, returns a short summary line"""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(25)
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    _snapshots.append((time.time(), snapshot))
+    if len(_snapshots) > MAX_SNAPSHOTS:
+        _snapshots.pop(0)
+    current, peak = tracemalloc.get_traced_memory()
+    return f"Snapshot #{len(_snapshots)} taken. Traced: {current / 1024:.1f} KiB (peak {peak / 1024:.1f} KiB)"
+
+
+def memory_diff(limit=40):
+    """
+    Compare the two most recent snapshots.
+    Returns the report as bytes, or None if there are fewer than two snapshots.
+    """
+    if len(_snapshots) < 2:
+        return None
+    (old_time, old), (new_time, new) = _snapshots[-2], _snapshots[-1]
+    stats = new.compare_to(old, 'traceback')
+
+    out = io.StringIO()
+    out.write(f"tracemalloc diff over {new_time - old_time:.1f}s, top {limit} by size delta\n\n")
+    for stat in stats[:limit]:
+        out.write(f"{stat.size_diff / 1024:+.1f} KiB ({stat.count_diff:+d} blocks), "
+                  f"now {stat.size / 1024:.1f} KiB in {stat.count} blocks\n")
+        for line in stat.traceback.format(most_recent_first=True):
+            out.write(f"    {line}\n")
+        out.write("\n")
+    return out.getvalue().encode('utf-8')
+
+
+def memory_stop():
+    """Stop tracemalloc and drop all snapshots"""
+    _snapshots.clear()
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def dump_tasks(loop=None):
+    """Return every pending asyncio task on the loop with its stack, as bytes"""
+    tasks = asyncio.all_tasks(loop)
+    out = io.StringIO()
+    out.write(f"{len(tasks)} pending task(s)\n\n")
+    for task in sorted(tasks, key=lambda t: t.get_name()):
+        out.write(f"=== {task.get_name()}: {task.get_coro()!r}\n")
+        task.print_stack(file=out)
+        out.write("\n")
+    return out.getvalue().encode('utf-8')
@@ -0,0 +1,81 @@
+"""
+Startup-time budget check.
+
+Imports the bot, its extensions and what `python bot.py` imports before logging in
+(certifi, health_server) in a fresh interpreter with `python -X importtime` and
+reports what each import costs. Exits with status 1 if the total is over budget.
+
+Usage: python startup_budget.py [--budget-ms 500] [--top 20]
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+import config
+
+# "import time:       412 |       1203 |     discord.utils"
+LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( +)(\S+)$')
+
+
+def measure(modules):
+    """Returns [(module, self_us, cumulative_us, depth)] in import order"""
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ,
+                   STATE_DB=os.path.join(tmp, 'state.db'),
+                   PLAYERS_DB=os.path.join(tmp, 'players.db'),
+                   LOG_LEVEL='ERROR')
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', 'import ' + ', '.join(modules)],
+            cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+            capture_output=True, text=True)
+    if result.returncode != 0:
+        sys.exit(f"Importing {', '.join(modules)} failed:\n{result.stderr[-2000:]}")
+
+    imports = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            imports.append((name, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--budget-ms', type=float, default=float(os.getenv('STARTUP_BUDGET_MS', 500)),
+                        help="maximum total import time (default: STARTUP_BUDGET_MS or 500)")
+    parser.add_argument('--top', type=int, default=20, help="number of imports to list")
+    args = parser.parse_args()
+
+    # Everything `python bot.py` imports before bot.run (Flask loads later, in the server thread)
+    modules = ['bot', *config.EXTENSIONS, 'certifi', 'health_server']
+    imports = measure(modules)
+    # Interpreter startup (site, encodings) is not counted, only what the bot pulls in
+    total_ms = sum(cumulative for name, _, cumulative, depth in imports if depth == 0 and name in modules) / 1000
+
+    print(f"Imports of {', '.join(modules)}: {len(imports)} modules, {total_ms:.1f} ms total\n")
+
+    print(f"Top {args.top} by cumulative time (module + everything it imports):")
+    for name, _, cumulative, depth in sorted(imports, key=lambda i: -i[2])[:args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}" + ("" if depth == 0 else f"  (depth {depth})"))
+
+    print(f"\nTop {args.top} by self time:")
+    for name, self_us, _, _ in sorted(imports, key=lambda i: -i[1])[:args.top]:
+        print(f"  {self_us / 1000:8.1f} ms  {name}")
+
+    print("\nTop-level imports:")
+    for name, _, cumulative, depth in imports:
+        if depth == 0:
+            print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    if total_ms > args.budget_ms:
+        print(f"\n❌ Startup imports take {total_ms:.1f} ms, over the {args.budget_ms:.0f} ms budget")
+        sys.exit(1)
+    print(f"\n✅ Startup imports take {total_ms:.1f} ms, within the {args.budget_ms:.0f} ms budget")
+
+
+if __name__ == '__main__':
+    main()
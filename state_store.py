@@ -0,0 +1,109 @@
+"""
+Small durable key/value store for bot state that must survive restarts
+(scheduler flags, dedup sets).
+
+Backed by SQLite in WAL mode. Reads happen once at startup (`load`); writes are
+write-behind: `set` only updates memory and marks the key dirty, a background
+task flushes all dirty keys in one transaction off the event loop.
+"""
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+
+from bot_logging import log, report_exception
+
+
+class StateStore:
+    """JSON values by key in a single SQLite table, with write-behind batching"""
+
+    def __init__(self, path, flush_delay=0.5):
+        self.path = path
+        self.flush_delay = flush_delay
+        self._values = {}
+        self._pending = {}
+        # _pending_lock only guards the dict swap so `set` never waits on disk
+        self._pending_lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._wakeup = None
+        self._flusher = None
+
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    def load(self):
+        """Read the whole state in a single query, returns {key: value}"""
+        started = time.perf_counter()
+        with self._db_lock:
+            rows = self._db.execute("SELECT key, value FROM state").fetchall()
+        self._values = {key: json.loads(value) for key, value in rows}
+        log.info("Loaded %d state key(s) from %s in %.1f ms", len(self._values), self.path,
+                 (time.perf_counter() - started) * 1000)
+        return dict(self._values)
+
+    def get(self, key, default=None):
+        """Last value set (or loaded) for the key, never touches the disk"""
+        return self._values.get(key, default)
+
+    def set(self, key, value):
+        """Queue a write. The value is serialized now, written by the next flush."""
+        self._values[key] = value
+        value = json.dumps(value)
+        with self._pending_lock:
+            self._pending[key] = value
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def flush(self):
+        """Write all pending keys in one transaction (blocking)"""
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        with self._db_lock:
+            try:
+                self._db.execute("BEGIN")
+                self._db.executemany(
+                    "INSERT INTO state (key, value) VALUES (?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                    pending.items())
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                # Put the writes back unless a newer value was queued meanwhile
+                with self._pending_lock:
+                    for key, value in pending.items():
+                        self._pending.setdefault(key, value)
+                raise
+        return len(pending)
+
+    def start(self):
+        """Start the write-behind task on the running event loop"""
+        if self._flusher is None or self._flusher.done():
+            self._wakeup = asyncio.Event()
+            if self._pending:
+                self._wakeup.set()
+            self._flusher = asyncio.get_running_loop().create_task(self._run(), name="state-store-flusher")
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            # Collect everything written in the next moment into one transaction
+            await asyncio.sleep(self.flush_delay)
+            self._wakeup.clear()
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception:
+                report_exception('state_store.flush')
+
+    def close(self):
+        """Final synchronous flush, call after the event loop has stopped"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+        try:
+            self.flush()
+        finally:
+            self._db.close()
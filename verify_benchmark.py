@@ -0,0 +1,356 @@
+"""
+Benchmarks the verify pipeline against a local mock of the Gemini API.
+
+By default it compares the old free-text verify prompt with the JSON-schema analysis.
+
+The mock answers a fixed set of screenshots the way models tend to: mostly clean,
+sometimes chatty, sometimes missing a field or unsure. The old flow is retried in
+full when a field comes back as N/A (what users did with `!verify`); the new flow
+does its own targeted re-ask. Token counts follow Gemini's accounting (258 tokens
+per image, ~4 characters per text token), latency is a fixed per-call cost plus a
+per-output-token cost, so the numbers compare the two flows, not real Gemini speed.
+
+With --command it runs the whole `!verify` command instead, against fake Discord
+objects where every REST call (send, role change) takes DISCORD_SECONDS and the
+screenshot download and model listing go to the mock as well.
+
+With --command --legacy it times the previous, sequential `!verify` flow against the
+same fakes instead, for a before/after comparison.
+
+With --workers N the analyses run in N AI worker processes (see ai_workers.py).
+
+Usage: python verify_benchmark.py [--rounds 5] [--command [--legacy]] [--workers 0]
+"""
+import argparse
+import asyncio
+import base64
+import io
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+
+from aiohttp import ClientSession, web
+
+# The mock has to be configured before the bot modules read the settings
+HOST, PORT = '127.0.0.1', 8765
+os.environ['GEMINI_API_BASE'] = f"http://{HOST}:{PORT}"
+os.environ['GEMINI_API_KEY'] = 'mock'
+
+import discord  # noqa: E402
+
+import ai_workers  # noqa: E402
+from cogs.verify import (MIN_CONFIDENCE, VERIFY_CHANNEL_ID, Verify, analyze_verification_image,  # noqa: E402
+                         find_gemini_models, format_verification_message, parse_verification,
+                         verification_roles)
+from outbox import LOW, NORMAL, Outbox  # noqa: E402
+from player_registry import PlayerRegistry  # noqa: E402
+
+# The prompt `!verify` used before the JSON schema
+LEGACY_PROMPT = "Analyze this Roblox screenshot and extract: 1) Username on Roblox (name above/near character), 2) Level (number after 'Level:'), 3) Rating (number after 'Rating:'). Respond ONLY in format:\nUsername: [username]\nLevel: [level]\nRating: [rating]"
+
+# Mock latency model
+CALL_SECONDS = 0.4
+OUTPUT_TOKEN_SECONDS = 0.01
+IMAGE_TOKENS = 258
+# Fake Discord / CDN latency for --command
+DISCORD_SECONDS = 0.12
+DOWNLOAD_SECONDS = 0.1
+LIST_MODELS_SECONDS = 0.15
+
+# Per screenshot: the free-text answers (first try, user's retry) and the JSON answers (first, re-ask)
+SCREENSHOTS = [
+    {'legacy': ["Username: KnightOfGold\nLevel: 42\nRating: 1,234"],
+     'json': [{"username": "KnightOfGold", "level": 42, "rating": 1234, "confidence": 0.95}]},
+    {'legacy': ["Sure! Here is what I found in the screenshot:\n\nUsername: sir_bulwark\nLevel: 17\nRating: 980\n\n"
+                "The username is shown above the character and the level and rating are in the top left corner. "
+                "Let me know if you need anything else!"],
+     'json': [{"username": "sir_bulwark", "level": 17, "rating": 980, "confidence": 0.9}]},
+    {'legacy': ["Username: Halberdier99\nLevel: N/A\nRating: 1502",
+                "Username: Halberdier99\nLevel: 23\nRating: 1502"],
+     'json': [{"username": "Halberdier99", "level": None, "rating": 1502, "confidence": 0.8},
+              {"level": 23, "confidence": 0.9}]},
+    {'legacy': ["Username: N/A\nLevel: 5\nRating: N/A",
+                "Username: blurry_player\nLevel: 5\nRating: 310"],
+     'json': [{"username": "blurry_p1ayer", "level": 5, "rating": None, "confidence": 0.3},
+              {"username": "blurry_player", "level": 5, "rating": 310, "confidence": 0.7}]},
+    {'legacy': ["Username: StilettoSam\nLevel: 61\nRating: 2,045"],
+     'json': [{"username": "StilettoSam", "level": 61, "rating": 2045, "confidence": 0.97}]},
+    {'legacy': ["Username: Guesmand_Lord\nLevel: 33\nRating: 1,777"],
+     'json': [{"username": "Guesmand_Lord", "level": 33, "rating": 1777, "confidence": 0.92}]},
+]
+
+
+def tokens(text):
+    return math.ceil(len(text) / 4)
+
+
+def make_app():
+    legacy_attempts = {}
+
+    async def generate(request):
+        body = await request.json()
+        contents = body['contents']
+        parts = contents[0]['parts']
+        image = base64.b64decode(next(p['inline_data']['data'] for p in parts if 'inline_data' in p))
+        fixture = SCREENSHOTS[int(image.decode().split('-')[1])]
+
+        schema = body.get('generationConfig', {}).get('responseSchema')
+        if schema:
+            answer = dict(fixture['json'][min(len(contents) // 2, len(fixture['json']) - 1)])
+            # Like the prompt asks, an optional confidence is only given when the model is unsure
+            if 'confidence' not in schema.get('required', []) and answer.get('confidence', 0) >= MIN_CONFIDENCE:
+                del answer['confidence']
+            answer = json.dumps(answer)
+        else:
+            attempt = legacy_attempts.get(image, 0)
+            legacy_attempts[image] = attempt + 1
+            answer = fixture['legacy'][min(attempt, len(fixture['legacy']) - 1)]
+
+        prompt_tokens = sum(IMAGE_TOKENS if 'inline_data' in p else tokens(p['text'])
+                            for turn in contents for p in turn['parts'])
+        max_tokens = body.get('generationConfig', {}).get('maxOutputTokens')
+        output_tokens = min(tokens(answer), max_tokens) if max_tokens else tokens(answer)
+        await asyncio.sleep(CALL_SECONDS + output_tokens * OUTPUT_TOKEN_SECONDS)
+        return web.json_response({
+            'candidates': [{'content': {'parts': [{'text': answer}]}}],
+            'usageMetadata': {'promptTokenCount': prompt_tokens, 'candidatesTokenCount': output_tokens},
+        })
+
+    async def list_models(request):
+        await asyncio.sleep(LIST_MODELS_SECONDS)
+        return web.json_response({'models': [
+            {'name': 'models/gemini-1.5-flash', 'supportedGenerationMethods': ['generateContent']}]})
+
+    async def attachment(request):
+        await asyncio.sleep(DOWNLOAD_SECONDS)
+        return web.Response(body=f"screenshot-{request.match_info['index']}".encode(), content_type='image/png')
+
+    app = web.Application()
+    app.router.add_post('/{version}/models/{model}', generate)
+    app.router.add_get('/v1beta/models', list_models)
+    app.router.add_get('/attachments/{index}', attachment)
+    return app, legacy_attempts
+
+
+async def legacy_verify(session, image_data, usage):
+    """The previous flow: free-text prompt, and the user runs !verify again if anything is N/A"""
+    values = None
+    for _ in range(2):
+        data = {"contents": [{"parts": [
+            {"text": LEGACY_PROMPT},
+            {"inline_data": {"mime_type": "image/png", "data": base64.b64encode(image_data).decode('utf-8')}},
+        ]}]}
+        async with session.post(f"http://{HOST}:{PORT}/v1beta/models/gemini-1.5-flash:generateContent?key=mock",
+                                json=data) as resp:
+            result = await resp.json()
+        usage['calls'] = usage.get('calls', 0) + 1
+        usage['prompt_tokens'] = usage.get('prompt_tokens', 0) + result['usageMetadata']['promptTokenCount']
+        usage['output_tokens'] = usage.get('output_tokens', 0) + result['usageMetadata']['candidatesTokenCount']
+        values = parse_verification(result['candidates'][0]['content']['parts'][0]['text'])
+        if "N/A" not in values:
+            break
+    return values
+
+
+async def run(rounds):
+    app, legacy_attempts = make_app()
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, HOST, PORT).start()
+
+    results = {}
+    try:
+        async with ClientSession() as session:
+            for name in ('free text', 'json schema'):
+                usage = {}
+                unread = 0
+                started = time.perf_counter()
+                for _ in range(rounds):
+                    legacy_attempts.clear()
+                    for i in range(len(SCREENSHOTS)):
+                        image_data = f"screenshot-{i}".encode()
+                        if name == 'free text':
+                            values = await legacy_verify(session, image_data, usage)
+                        else:
+                            values = await analyze_verification_image(
+                                session, 'mock', ['gemini-1.5-flash'], image_data, 'image/png', usage=usage)
+                        unread += sum(1 for value in values if value == "N/A")
+                results[name] = (usage, unread, time.perf_counter() - started)
+    finally:
+        await runner.cleanup()
+
+    verifications = rounds * len(SCREENSHOTS)
+    print(f"{verifications} verifications per mode (mock Gemini, {CALL_SECONDS * 1000:.0f} ms per call "
+          f"+ {OUTPUT_TOKEN_SECONDS * 1000:.0f} ms per output token)\n")
+    print(f"{'':12} {'calls':>7} {'output tok':>11} {'prompt tok':>11} {'unread':>7} {'per verify':>11}")
+    for name, (usage, unread, elapsed) in results.items():
+        print(f"{name:12} {usage['calls']:7} {usage['output_tokens']:11} {usage['prompt_tokens']:11} "
+              f"{unread:7} {elapsed / verifications * 1000:8.0f} ms")
+
+
+class FakeRole:
+    def __init__(self, name, position):
+        self.name = name
+        self.position = position
+        self.mention = f"@{name}"
+
+    def __gt__(self, other):
+        return self.position > other.position
+
+    def is_default(self):
+        return self.position == 0
+
+
+class FakeChannel:
+    def __init__(self, channel_id):
+        self.id = channel_id
+        self.mention = f"#{channel_id}"
+
+    async def send(self, content=None, **kwargs):
+        await asyncio.sleep(DISCORD_SECONDS)
+        return content
+
+
+class FakeMember:
+    def __init__(self, member_id, roles, top_role=None):
+        self.id = member_id
+        self.mention = f"<@{member_id}>"
+        self.roles = list(roles)
+        self.top_role = top_role
+        self.guild_permissions = discord.Permissions(manage_roles=True)
+
+    async def add_roles(self, *roles, reason=None):
+        await asyncio.sleep(DISCORD_SECONDS)
+        self.roles.extend(roles)
+
+    async def remove_roles(self, *roles, reason=None):
+        await asyncio.sleep(DISCORD_SECONDS)
+        self.roles = [role for role in self.roles if role not in roles]
+
+    async def edit(self, roles=None, reason=None):
+        await asyncio.sleep(DISCORD_SECONDS)
+        self.roles = list(roles)
+
+
+class FakeAttachment:
+    def __init__(self, url):
+        self.url = url
+        self.content_type = 'image/png'
+
+
+class FakeBot:
+    def __init__(self, players):
+        self.outbox = Outbox()
+        self.players = players
+        self.channels = {VERIFY_CHANNEL_ID: FakeChannel(VERIFY_CHANNEL_ID)}
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+
+class FakeContext:
+    def __init__(self, guild, author, channel, attachment):
+        self.guild = guild
+        self.author = author
+        self.channel = channel
+        self.message = type('FakeMessage', (), {'attachments': [attachment], 'id': 0})()
+        self.command = None
+
+    async def send(self, content=None, **kwargs):
+        return await self.channel.send(content, **kwargs)
+
+
+async def legacy_verify_command(cog, ctx):
+    """
+    The `!verify` steps as they ran before they were made concurrent: status message,
+    download, model list and analysis, registry, up to three role calls, post, confirmation.
+    """
+    bot = cog.bot
+    attachment = ctx.message.attachments[0]
+    await bot.outbox.send(ctx.channel, "🔍 Analyzing image...", priority=LOW)
+    async with ClientSession() as session:
+        async with session.get(attachment.url) as resp:
+            image_data = await resp.read()
+    async with ClientSession() as session:
+        models_to_try = await find_gemini_models(session, 'mock')
+        username, level, rating = await analyze_verification_image(
+            session, 'mock', models_to_try, image_data, attachment.content_type)
+    await cog.register_players(ctx, ctx.guild, [(ctx.author, username, level, rating)])
+
+    peasant_role, member_role, guest_role = verification_roles(ctx.guild)
+    me = ctx.guild.me
+    if peasant_role and me.guild_permissions.manage_roles:
+        if me.top_role > peasant_role and peasant_role not in ctx.author.roles:
+            await ctx.author.add_roles(peasant_role, reason="Verified via !verify command")
+        if member_role and me.top_role > member_role and member_role not in ctx.author.roles:
+            await ctx.author.add_roles(member_role, reason="Verified via !verify command")
+        if guest_role and me.top_role > guest_role and guest_role in ctx.author.roles:
+            await ctx.author.remove_roles(guest_role, reason="Verified - guest role removed")
+
+    formatted_message = format_verification_message(username, level, rating, peasant_role, ctx.author)
+    image_file = discord.File(io.BytesIO(image_data), filename=f"verification_{ctx.author.id}.png")
+    await bot.outbox.send(bot.get_channel(VERIFY_CHANNEL_ID), formatted_message, priority=NORMAL, file=image_file)
+    await bot.outbox.send(ctx.channel, "✅ Verification complete! Message sent to the verification channel.", priority=LOW)
+
+
+async def run_command(rounds, workers=0, legacy=False):
+    app, _ = make_app()
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, HOST, PORT).start()
+
+    everyone, guest, member_role, peasant = (FakeRole(name, position) for position, name in
+                                             enumerate(('@everyone', 'guest', 'member', 'peasant')))
+    bot_role = FakeRole('bot', 10)
+    guild = type('FakeGuild', (), {'id': 1, 'roles': [everyone, guest, member_role, peasant, bot_role]})()
+    guild.me = FakeMember(0, [everyone, bot_role], top_role=bot_role)
+
+    timings = []
+    ai_workers.start(workers)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            players = PlayerRegistry(os.path.join(tmp, 'players.db'))
+            bot = FakeBot(players)
+            cog = Verify(bot)
+            for i in range(rounds * len(SCREENSHOTS)):
+                # Fresh queues, so the per-channel message bucket doesn't carry over between runs
+                bot.outbox = Outbox()
+                author = FakeMember(1000 + i, [everyone, guest])
+                ctx = FakeContext(guild, author, FakeChannel(2),
+                                  FakeAttachment(f"http://{HOST}:{PORT}/attachments/{i % len(SCREENSHOTS)}"))
+                started = time.perf_counter()
+                if legacy:
+                    await legacy_verify_command(cog, ctx)
+                else:
+                    await cog.verify_user.callback(cog, ctx)
+                timings.append(time.perf_counter() - started)
+                assert peasant in author.roles and guest not in author.roles, "roles were not applied"
+            players.close()
+    finally:
+        ai_workers.stop()
+        await runner.cleanup()
+
+    timings.sort()
+    flow = "previous sequential flow" if legacy else f"{workers or 'no'} AI worker(s)"
+    print(f"!verify end to end, {len(timings)} runs, {flow} (Discord REST {DISCORD_SECONDS * 1000:.0f} ms, "
+          f"download {DOWNLOAD_SECONDS * 1000:.0f} ms, model list {LIST_MODELS_SECONDS * 1000:.0f} ms, "
+          f"Gemini {CALL_SECONDS * 1000:.0f} ms + {OUTPUT_TOKEN_SECONDS * 1000:.0f} ms/token)")
+    print(f"  mean {sum(timings) / len(timings) * 1000:.0f} ms, p50 {timings[len(timings) // 2] * 1000:.0f} ms, "
+          f"max {timings[-1] * 1000:.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=5, help="passes over the mock screenshots")
+    parser.add_argument('--command', action='store_true', help="time the whole !verify command")
+    parser.add_argument('--legacy', action='store_true', help="with --command, time the previous sequential flow")
+    parser.add_argument('--workers', type=int, default=0, help="AI worker processes for --command")
+    args = parser.parse_args()
+    asyncio.run(run_command(args.rounds, args.workers, args.legacy) if args.command else run(args.rounds))
+
+
+if __name__ == '__main__':
+    sys.exit(main())